@@ -0,0 +1,182 @@
+"""
+Search for the historical windows of candles that look most like a given window
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+from typing import Optional
+
+features = ["Open", "High", "Low", "Price", "Body", "L-Wick", "U-Wick"]
+
+def window_embeddings(open_price: np.ndarray,
+                      high: np.ndarray,
+                      low: np.ndarray,
+                      close: np.ndarray,
+                      window: int) -> np.ndarray:
+    """
+    Normalised embeddings of every window of 'window' consecutive candles of a single series,
+    as a (windows, window * 7) array where row i ends at candle i + window - 1
+    Prices are taken relative to the last close of the window and every feature is scaled by the
+    window's average High - Low range, so that windows compare across yield levels and volatilities
+    """
+
+    ohlc = np.stack([open_price, high, low, close]).astype(float)
+    views = np.lib.stride_tricks.sliding_window_view(ohlc, window, axis=1)
+    o, h, l, c = views
+
+    scale = (h - l).mean(axis=1, keepdims=True)
+    scale[~(scale > 0)] = 1.0
+    reference = c[:, -1:]
+
+    body = abs(o - c)
+    lower = np.minimum(o, c) - l
+    upper = h - np.maximum(o, c)
+    embeddings = np.concatenate([o - reference, h - reference, l - reference, c - reference, body, lower, upper], axis=1)
+
+    return embeddings / scale
+
+class AnalogueIndex:
+    """
+    OOP analogue search class, holding the embeddings of every window of every series added to it
+    """
+
+    def __init__(self,
+                 window: Optional[int] = 5,
+                 horizon: Optional[int] = 5,
+                 dtype: Optional[str] = "float64") -> None:
+
+        self.window = window
+        self.horizon = horizon
+        self.dtype = dtype
+        # Raw candles of every series, keyed by (name, DF)
+        self.series = {}
+        self.keys = []
+        # Embeddings are kept in a buffer that grows by doubling, so that appending bars is cheap
+        self.embeddings = np.empty((0, window * len(features)), dtype=dtype)
+        self.norms = np.empty(0, dtype=dtype)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, key: tuple, embeddings: np.ndarray, ends: np.ndarray) -> None:
+        """
+        Add the embeddings of windows of one series, ending at positions 'ends' of that series
+        """
+
+        valid = ~np.isnan(embeddings).any(axis=1)
+        embeddings, ends = embeddings[valid], ends[valid]
+        n = len(embeddings)
+
+        if self.size + n > len(self.embeddings):
+            capacity = max(2 * len(self.embeddings), self.size + n)
+            for name in ["embeddings", "norms", "rows", "ends"]:
+                old = getattr(self, name)
+                new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self.size] = old[:self.size]
+                setattr(self, name, new)
+
+        part = slice(self.size, self.size + n)
+        self.embeddings[part] = embeddings
+        self.norms[part] = (embeddings**2).sum(axis=1)
+        self.rows[part] = self.keys.index(key)
+        self.ends[part] = ends
+        self.size += n
+
+    def add(self, data: pd.DataFrame, name: Optional[str] = "") -> "AnalogueIndex":
+        """
+        Add every window of a dataframe, one series per Monte Carlo copy if it has a "DF" column
+        """
+
+        groups = data.groupby("DF", sort=True) if "DF" in data.columns else [(0, data)]
+        for copy, df in groups:
+            key = (name, int(copy))
+            if key in self.series:
+                raise Exception("Error: Series already in the index, use append for new bars")
+            self.series[key] = {col: df[col].to_numpy() for col in ["Date", "Open", "High", "Low", "Price"]}
+            self.keys.append(key)
+            if len(df) >= self.window:
+                embeddings = window_embeddings(*(self.series[key][col] for col in ["Open", "High", "Low", "Price"]), self.window)
+                self.extend(key, embeddings, np.arange(self.window - 1, len(df)))
+
+        return self
+
+    def append(self, new_data: pd.DataFrame, name: Optional[str] = "", copy: Optional[int] = 0) -> "AnalogueIndex":
+        """
+        Extend one series with newly arrived bars, embedding only the windows that end on them
+        """
+
+        key = (name, copy)
+        if key not in self.series:
+            return self.add(new_data.assign(DF=copy), name)
+
+        series = self.series[key]
+        new_data = new_data[new_data["Date"] > series["Date"][-1]].sort_values(["Date"])
+        if new_data.empty:
+            return self
+        n_old = len(series["Date"])
+        for col in series:
+            series[col] = np.concatenate([series[col], new_data[col].to_numpy()])
+
+        # Windows ending on the new bars reach back window - 1 bars into the old ones
+        first = max(0, n_old - self.window + 1)
+        if len(series["Date"]) - first >= self.window:
+            embeddings = window_embeddings(*(series[col][first:] for col in ["Open", "High", "Low", "Price"]), self.window)
+            self.extend(key, embeddings, np.arange(first + self.window - 1, len(series["Date"])))
+
+        return self
+
+    def query(self,
+              embeddings: np.ndarray,
+              k: Optional[int] = 10,
+              complete: Optional[bool] = True) -> pd.DataFrame:
+        """
+        Top-k nearest windows to each row of 'embeddings', by Euclidean distance computed as
+        |a|^2 - 2 a.b + |b|^2 with one matrix product over the whole index
+        With 'complete', only windows whose forward return is already known are matched,
+        which also leaves out the query window itself and those overlapping it
+        """
+
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=self.dtype))
+        index, norms = self.embeddings[:self.size], self.norms[:self.size]
+        rows, ends = self.rows[:self.size], self.ends[:self.size]
+        lengths = np.array([len(self.series[key]["Date"]) for key in self.keys])
+
+        distances = (queries**2).sum(axis=1)[:, None] - 2 * (queries @ index.T) + norms[None, :]
+        if complete:
+            distances[:, ends + self.horizon >= lengths[rows]] = np.inf
+        k = min(k, int(np.isfinite(distances).sum(axis=1).min()))
+        if k == 0:
+            return pd.DataFrame(columns=["Query", "Rank", "Name", "DF", "Date", "Distance", "Return"])
+
+        # Partial selection of the k smallest, then sort only those
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+
+        result = []
+        for i, matches in enumerate(nearest):
+            for rank, j in enumerate(matches):
+                series = self.series[self.keys[rows[j]]]
+                end = ends[j]
+                forward = series["Price"][end + self.horizon] - series["Price"][end] if end + self.horizon < len(series["Price"]) else np.nan
+                result.append((i, rank + 1, *self.keys[rows[j]], series["Date"][end],
+                               np.sqrt(max(distances[i, j], 0.0)), forward))
+
+        return pd.DataFrame(result, columns=["Query", "Rank", "Name", "DF", "Date", "Distance", "Return"])
+
+    def search(self,
+               recent: pd.DataFrame,
+               k: Optional[int] = 10,
+               complete: Optional[bool] = True) -> pd.DataFrame:
+        """
+        Top-k past windows most like the last 'window' candles of a dataframe, with their forward change in yield
+        """
+
+        recent = recent.iloc[-self.window:]
+        if len(recent) < self.window:
+            raise Exception("Error: Need at least {} candles to search".format(self.window))
+        embedding = window_embeddings(*(recent[col].to_numpy() for col in ["Open", "High", "Low", "Price"]), self.window)
+
+        return self.query(embedding, k, complete).drop(columns="Query")
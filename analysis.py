@@ -3,13 +3,19 @@ Analysis of candelstick patterns
 """
 
 # Import libraries
+import copy
+import pickle
 import pandas as pd
 import numpy as np
 
+from collections import deque
 from typing import Optional, Tuple
 from data import read_local_file, check_bad_values, correct_dates
-from data import correct_changes, asym_rolling_minmax, expanding_quantiles
-from data import resampled_data
+from data import correct_changes, asym_rolling_minmax, expanding_quantiles, rolling_quantiles
+from data import resampled_data, resample_ohlc, set_precision, filter_data, copy_offsets, SEED
+from cache import CovariateCache, default_cache
+from predicates import predicates, columns as predicate_columns
+from store import ResultsStore
 from plotting import summary_plot, candlestick_plot, scatter_matrix_plot
 from plotting import multiple_candlestick, monte_carlo_paths
 
@@ -22,6 +28,25 @@ patterns = ["hammer", "inv_hammer",
             "crows", "cloud",
             "doji", "spinning",
             "falling", "rising"]
+# Patterns that need a local extremum, which is only confirmed look_forward bars after the pattern's own bar
+extremum_patterns = ["hammer", "inv_hammer", "hanging", "shooting"]
+# Direction each pattern predicts, "cont" for a continuation of the day's move
+trends = {"hammer": "up", "inv_hammer": "up",
+          "bull_engulf": "up", "piercing": "up",
+          "morning": "up", "soldiers": "up",
+          "hanging": "down", "shooting": "down",
+          "bear_engulf": "down", "evening": "down",
+          "crows": "down", "cloud": "down",
+          "doji": "cont", "spinning": "cont",
+          "falling": "cont", "rising": "cont"}
+
+def load_state(filename: str) -> "Identify":
+    """
+    Load an Identify object saved with save_state
+    """
+
+    with open(filename, "rb") as f:
+        return pickle.load(f)
 
 class Identify:
     """
@@ -34,13 +59,26 @@ class Identify:
                  printout: Optional[bool] = False,
                  start_date: Optional[str] = "2000-01-01",
                  end_date: Optional[str] = "2025-01-01",
-                 import_df: Optional[pd.DataFrame] = None) -> None:
+                 import_df: Optional[pd.DataFrame] = None,
+                 cache: Optional[CovariateCache] = default_cache,
+                 store: Optional[ResultsStore] = None,
+                 dtype: Optional[str] = None,
+                 quantile_window: Optional[int] = None) -> None:
 
         self.country = country
         self.pattern = pattern
         self.printout = printout
         self.start_date = start_date
         self.end_date = end_date
+        self.look_back, self.look_forward = 3, 1
+        self.quantiles = [0.05, 0.25, 0.50]
+        # Body quantiles over the last quantile_window bars, or over all bars so far if None
+        self.quantile_window = quantile_window
+        # Sorted body lengths seen so far, kept so that new bars can be appended
+        self.state = None
+        self.cache = cache
+        self.store = store
+        self.dtype = dtype
 
         filename = country + "-bond-yield.csv"
 
@@ -58,9 +96,25 @@ class Identify:
             correct_changes(df)
             df.sort_values(["Date"], ignore_index=True, inplace=True)
         
-        mask = (df["Date"] >= pd.to_datetime(start_date)) & (df["Date"] <= pd.to_datetime(end_date))
-        self.data = df.loc[mask]
+        self.data = set_precision(filter_data(df, start_date, end_date), dtype)
         print("Selected", self.data.shape[0], "entries")
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+        The analysed dataframe, with the bars appended since it was last read concatenated once, now
+        """
+
+        if len(self.parts) > 1:
+            self.parts = [pd.concat(self.parts)]
+
+        return self.parts[0]
+
+    @data.setter
+    def data(self, data: pd.DataFrame) -> None:
+        # Appended bars are kept as separate parts, with the last bars needed to extend them in 'tail'
+        self.parts = [data]
+        self.tail = None
     
     def print_data(self, number: int) -> None:
         """
@@ -97,34 +151,62 @@ class Identify:
         # Calculate the upper wick length
         self.data["U-Wick"] = self.data["High"] - self.data[["Open", "Price"]].max(axis=1)
 
-        look_back, look_forward = 3, 1
-        quantiles = [0.05, 0.25, 0.50]
-        columns = [f"{int(q*100)}" + " " + "Body" for q in quantiles]
-        # Add columns that describe the patterns and trends
+        # Add columns that describe the patterns and trends,
+        # with one bit per entry of patterns set for every pattern found on a bar
         self.data["Pattern"] = ""
         self.data["Trend"] = ""
+        self.data["Mask"] = np.uint16(0)
         
         if "DF" in self.data.columns:
+            self.state = None
             self.data["Min"] = False
             self.data["Max"] = False
-            for i in range(self.data["DF"].iloc[-1] + 1):
-                # Calculate quantile data of body length
-                for col in columns:
-                    self.data.loc[self.data["DF"] == i, col] = expanding_quantiles(self.data[self.data["DF"] == i], "Body", quantiles)[col]
-                # Calculate local minimum over (asymmetrical) window size
-                # We can only detect a local minimum look_forward days after it has happened
-                self.data.loc[self.data["DF"] == i, "Min"] = (self.data[self.data["DF"] == i]["Price"] == asym_rolling_minmax(self.data[self.data["DF"] == i], look_back, look_forward, True))
-                self.data.loc[self.data["DF"] == i, "Max"] = (self.data[self.data["DF"] == i]["Price"] == asym_rolling_minmax(self.data[self.data["DF"] == i], look_back, look_forward, False))
+            for i in np.unique(self.data["DF"]):
+                mask = self.data["DF"] == i
+                result = self.series_covariates(self.data[mask])
+                for col in result.columns:
+                    self.data.loc[mask, col] = result[col].to_numpy()
         else:
-            # Calculate quantile data of body length
-            result = expanding_quantiles(self.data, "Body", quantiles)
+            result = self.series_covariates(self.data)
             self.data = pd.concat([self.data, result], axis=1)
-            # Calculate local minimum over (asymmetrical) window size
-            # We can only detect a local minimum look_forward days after it has happened
-            self.data["Min"] = (self.data["Price"] == asym_rolling_minmax(self.data, look_back, look_forward, True))
-            self.data["Max"] = (self.data["Price"] == asym_rolling_minmax(self.data, look_back, look_forward, False))
+            if self.quantile_window is None:
+                self.state = sorted(self.data["Body"].dropna())
+            else:
+                recent = deque(self.data["Body"].iloc[-self.quantile_window:])
+                self.state = (sorted(x for x in recent if not np.isnan(x)), recent)
 
         return self.data
+
+    def series_covariates(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculate the body quantiles and local extrema of a single series,
+        reusing earlier results for identical data and parameters from the cache
+        """
+
+        look_back, look_forward = self.look_back, self.look_forward
+        quantiles = self.quantiles
+        window = self.quantile_window
+
+        if self.cache is not None:
+            key = self.cache.key(data, look_back=look_back, look_forward=look_forward, quantiles=quantiles, window=window, dtype=str(data["Body"].dtype))
+            result = self.cache.get(key)
+            if result is not None:
+                return result.set_axis(data.index)
+
+        # Calculate quantile data of body length
+        if window is None:
+            result = expanding_quantiles(data, "Body", quantiles, dtype=data["Body"].dtype)
+        else:
+            result = rolling_quantiles(data, "Body", window, quantiles, dtype=data["Body"].dtype)
+        # Calculate local minimum over (asymmetrical) window size
+        # We can only detect a local minimum look_forward days after it has happened
+        result["Min"] = (data["Price"] == asym_rolling_minmax(data, look_back, look_forward, True))
+        result["Max"] = (data["Price"] == asym_rolling_minmax(data, look_back, look_forward, False))
+
+        if self.cache is not None:
+            self.cache.put(key, result)
+
+        return result
     
     def analyse_pattern(self) -> pd.DataFrame:
         """
@@ -132,6 +214,16 @@ class Identify:
         """
 
         self.generate_covariates()
+        self.find_patterns()
+        if self.store is not None:
+            self.store.write_patterns(self.country, self.data)
+
+        return self.data
+
+    def find_patterns(self) -> None:
+        """
+        Search the covariates for the selected pattern(s)
+        """
 
         if self.pattern == "all":
             all = pd.concat([self.hammer(), self.inv_hammer(), self.bull_engulf(), self.piercing(),
@@ -192,9 +284,159 @@ class Identify:
             self.rising()
         else:
             print("Error: Pattern not recognised")
-        
+
+    def append(self, new_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Extend the covariates, patterns and trends to newly arrived bars,
+        only revisiting the last few bars whose local extrema or patterns could change
+        Work is proportional to the number of new bars: the earlier bars are left untouched and the new ones
+        are kept as a separate part of the data until it is next read
+        Returns the new bars along with the earlier bars that were updated
+        """
+
+        if self.state is None:
+            raise Exception("Error: Appending requires a single series analysed with analyse_pattern")
+
+        # Bars that new ones can change (pending extrema) or look back at (extrema windows and patterns)
+        pending = self.look_forward
+        context = max(self.look_back, 4) + pending
+        if self.tail is None:
+            self.tail = self.parts[-1].iloc[-context:]
+        tail = self.tail
+
+        new_data = new_data.copy()
+        if new_data["Date"].dtype == "string" or new_data["Date"].dtype == object:
+            check_bad_values(new_data)
+            correct_dates(new_data)
+            correct_changes(new_data)
+        new_data = new_data[new_data["Date"] > tail["Date"].iloc[-1]].sort_values(["Date"])
+        if new_data.empty:
+            return new_data
+        set_precision(new_data, self.dtype)
+        new_data.index = range(tail.index[-1] + 1, tail.index[-1] + 1 + len(new_data))
+
+        # Covariates of the new bars, extending the sorted body lengths
+        new_data["Body"] = abs(new_data["Open"] - new_data["Price"])
+        new_data["L-Wick"] = new_data[["Open", "Price"]].min(axis=1) - new_data["Low"]
+        new_data["U-Wick"] = new_data["High"] - new_data[["Open", "Price"]].max(axis=1)
+        new_data["Pattern"] = ""
+        new_data["Trend"] = ""
+        new_data["Mask"] = np.uint16(0)
+        new_data["Min"] = False
+        new_data["Max"] = False
+        if self.quantile_window is None:
+            quantiles = expanding_quantiles(new_data, "Body", self.quantiles, self.state, new_data["Body"].dtype)
+        else:
+            quantiles = rolling_quantiles(new_data, "Body", self.quantile_window, self.quantiles, self.state, new_data["Body"].dtype)
+        new_data = pd.concat([new_data, quantiles], axis=1)
+        window = pd.concat([tail, new_data[tail.columns]])
+
+        # Local extrema of the last look_forward old bars were pending on the new bars
+        start = max(0, len(tail) - pending)
+        first = max(0, start - self.look_back)
+        minimum = asym_rolling_minmax(window.iloc[first:], self.look_back, self.look_forward, True)[start - first:]
+        maximum = asym_rolling_minmax(window.iloc[first:], self.look_back, self.look_forward, False)[start - first:]
+        window.iloc[start:, window.columns.get_loc("Min")] = (window["Price"].iloc[start:] == minimum).values
+        window.iloc[start:, window.columns.get_loc("Max")] = (window["Price"].iloc[start:] == maximum).values
+
+        # Patterns look back at most four bars, so rescan only those plus the changed bars
+        first = max(0, start - 4)
+        scanner = copy.copy(self)
+        scanner.printout = False
+        scanner.data = window.iloc[first:].copy()
+        scanner.data["Pattern"] = ""
+        scanner.data["Trend"] = ""
+        scanner.data["Mask"] = np.uint16(0)
+        scanner.find_patterns()
+        for col in ["Pattern", "Trend", "Mask"]:
+            window.iloc[start:, window.columns.get_loc(col)] = scanner.data[col].iloc[start - first:].values
+
+        # Replace the updated bars at the end of the data, dropping them from the parts they were in
+        updated = len(tail) - start
+        while updated > 0:
+            last = self.parts.pop()
+            if len(last) > updated:
+                self.parts.append(last.iloc[:len(last) - updated])
+            updated -= min(updated, len(last))
+        self.parts.append(window.iloc[start:])
+        self.tail = window.iloc[-context:]
+        self.end_date = str(window["Date"].iloc[-1].date())
+
+        return window.iloc[start:]
+
+    def multi_timeframe(self, frequencies: Optional[list] = ["W", "M"]) -> pd.DataFrame:
+        """
+        Scan weekly, monthly (or any other frequency) candles built from the daily data,
+        and align their patterns and trends back onto the daily rows as "Pattern W", "Trend W" etc.
+        Each day only sees the patterns known by then: those of the latest completed candle,
+        except for the patterns that need a local extremum, which are only known look_forward candles later
+        As in analyse_pattern, the label of a day is the last of its known patterns in the patterns list
+        """
+
+        extremum = np.uint16(sum(1 << patterns.index(name) for name in extremum_patterns))
+
+        for frequency in frequencies:
+            bars, groups = resample_ohlc(self.data, frequency)
+            scanner = copy.copy(self)
+            scanner.printout = False
+            # Only the daily patterns are recorded in the store
+            scanner.store = None
+            scanner.data = bars
+            scanner.analyse_pattern()
+
+            # Before the last day of a candle, only the previous candle is known,
+            # and the extrema of a candle are only confirmed look_forward candles after it
+            last_day = np.concatenate([groups[1:] != groups[:-1], [True]])
+            known = groups - (~last_day)
+            bits = np.zeros(len(known), dtype=np.uint16)
+            for delay, part in [(0, ~extremum), (self.look_forward, extremum)]:
+                candle = known - delay
+                valid = candle >= 0
+                if "DF" in bars.columns:
+                    valid &= (bars["DF"].to_numpy()[np.maximum(candle, 0)] == self.data["DF"].to_numpy())
+                bits |= np.where(valid, scanner.data["Mask"].to_numpy()[np.maximum(candle, 0)] & part, 0).astype(np.uint16)
+
+            label, trend = np.full(len(bits), "", dtype=object), np.full(len(bits), "", dtype=object)
+            for code, name in enumerate(patterns):
+                found = (bits >> code) & 1 == 1
+                label[found], trend[found] = name, trends[name]
+            self.data["Pattern " + frequency] = label
+            self.data["Trend " + frequency] = trend
+
+            if self.printout:
+                print("Found", (scanner.data["Pattern"] != "").sum(), "patterns over", len(bars), frequency, "candles")
+
         return self.data
 
+    def pattern_mask(self, name: str) -> np.ndarray:
+        """
+        Rows meeting the conditions of a pattern, evaluated by the predicates shared with the Panel scanner
+        Each Monte Carlo copy is evaluated on its own, so that the lagged candles never reach into the previous copy
+        """
+
+        covariates = {col: self.data[col].to_numpy() for col in predicate_columns}
+        if "DF" not in self.data.columns:
+            with np.errstate(invalid="ignore"):
+                return predicates[name](covariates)
+
+        # Copies of equal length are stacked as rows, along whose last axis the predicates lag
+        offsets = copy_offsets(self.data)
+        lengths = offsets[:, 1] - offsets[:, 0]
+        with np.errstate(invalid="ignore"):
+            if np.all(lengths == lengths[0]):
+                stacked = {col: values.reshape(len(offsets), -1) for col, values in covariates.items()}
+                return predicates[name](stacked).reshape(-1)
+            return np.concatenate([predicates[name]({col: values[start:end] for col, values in covariates.items()})
+                                   for start, end in offsets])
+
+    def save_state(self, filename: str) -> None:
+        """
+        Save the analysed data and covariate state, ready for appending new bars later
+        """
+
+        with open(filename, "wb") as f:
+            pickle.dump(self, f)
+
     def hammer(self) -> pd.DataFrame:
         """
         The hammer candlestick pattern is formed of a short body with a long lower wick,
@@ -206,17 +448,11 @@ class Identify:
         but green hammers indicate a stronger bull market than red hammers.
         """
 
-        # Lower wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["L-Wick"])
-        # Body within the 25th percentile
-        mask_short_body = (self.data["Body"] <= self.data["25 Body"])
-        # Local minimum
-        mask_minimum = (self.data["Min"] == True)
-        
-        mask = mask_long_wick & mask_short_body & mask_minimum
+        mask = self.pattern_mask("hammer")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "hammer"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("hammer"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["hammer"]
 
         if self.printout:
             if filtered_data.empty:
@@ -238,17 +474,11 @@ class Identify:
         The inverse hammer suggests that buyers will soon have control of the market.
         """
 
-        # Lower wick <= 25% of body
-        mask_short_wick = (0.25*self.data["Body"] >= self.data["L-Wick"])
-        # Upper wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["U-Wick"])
-        # Local minimum
-        mask_minimum = (self.data["Min"] == True)
-
-        mask = mask_short_wick & mask_long_wick & mask_minimum
+        mask = self.pattern_mask("inv_hammer")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "inv_hammer"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("inv_hammer"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["inv_hammer"]
 
         if self.printout:
             if filtered_data.empty:
@@ -269,19 +499,11 @@ class Identify:
         culminating in an obvious win for buyers.
         """
 
-        # Second candle has a green body
-        mask_second_red = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_green = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # First candle has a short body (body within the 50th percentile)
-        mask_first_short = (self.data["Body"].shift(1) <= self.data["50 Body"])
-        # First candle is engulfed by the second candle
-        mask_engulf = (self.data["Open"] < self.data["Price"].shift(1)) & (self.data["Price"] > self.data["Open"].shift(1))
-
-        mask = mask_second_red & mask_first_green & mask_first_short & mask_engulf
+        mask = self.pattern_mask("bull_engulf")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "bull_engulf"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("bull_engulf"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["bull_engulf"]
 
         if self.printout:
             if filtered_data.empty:
@@ -303,22 +525,11 @@ class Identify:
         as the price is pushed up to or above the mid-price of the previous day.
         """
 
-        # Second candle has a green body
-        mask_second_green = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_red = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # Both candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(1) >= self.data["50 Body"])
-        mask_second_long = (self.data["Body"] >= self.data["50 Body"])
-        # Significant gap down between first candle price and second candle opening
-        mask_gap_down = (self.data["Price"].shift(1) - self.data["Open"] >= self.data["25 Body"])
-        # Price on second bar must be must be more than halfway up the body of the first bar
-        mask_body = (self.data["Price"] >= self.data["Price"].shift(1) + self.data["Body"].shift(1)/2)
-
-        mask = mask_first_red & mask_second_green & mask_first_long & mask_second_long & mask_gap_down & mask_body
+        mask = self.pattern_mask("piercing")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "piercing"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("piercing"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["piercing"]
 
         if self.printout:
             if filtered_data.empty:
@@ -340,20 +551,11 @@ class Identify:
         and a bull market is on the horizon.
         """
 
-        # Third candle has a green body
-        mask_third_green = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_red = (self.data["Open"].shift(2) > self.data["Price"].shift(2))
-        # First and third candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(2) >= self.data["50 Body"])
-        mask_third_long = (self.data["Body"] >= self.data["50 Body"])
-        # Second candle has a short body (less than the 25th percentile)
-        mask_second_short = (self.data["Body"].shift(1) <= self.data["25 Body"])
-
-        mask = mask_third_green & mask_first_red & mask_first_long & mask_third_long & mask_second_short
+        mask = self.pattern_mask("morning")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "morning"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("morning"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["morning"]
 
         if self.printout:
             if filtered_data.empty:
@@ -374,19 +576,11 @@ class Identify:
         and shows a steady advance of buying pressure.
         """
 
-        # All three bodies are green
-        mask_green = (self.data["Price"] > self.data["Open"]) & (self.data["Price"].shift(1) > self.data["Open"].shift(1)) & (self.data["Price"].shift(2) > self.data["Open"].shift(2))
-        # All three candles have small wicks (less than 25% of the body)
-        mask_upper_wicks = (0.25*self.data["Body"] >= self.data["U-Wick"]) & (0.25*self.data["Body"].shift(1) >= self.data["U-Wick"].shift(1)) & (0.25*self.data["Body"].shift(2) >= self.data["U-Wick"].shift(2))
-        mask_lower_wicks = (0.25*self.data["Body"] >= self.data["L-Wick"]) & (0.25*self.data["Body"].shift(1) >= self.data["L-Wick"].shift(1)) & (0.25*self.data["Body"].shift(2) >= self.data["L-Wick"].shift(2))
-        # Successive candles open and close progressively higher
-        mask_close = (self.data["Price"] > self.data["Price"].shift(1)) & (self.data["Price"].shift(1) > self.data["Price"].shift(2))
-        mask_open = (self.data["Open"] > self.data["Open"].shift(1)) & (self.data["Open"].shift(1) > self.data["Open"].shift(2))
-
-        mask = mask_green & mask_lower_wicks & mask_upper_wicks & mask_close & mask_open
+        mask = self.pattern_mask("soldiers")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "soldiers"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("soldiers"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["soldiers"]
 
         if self.printout:
             if filtered_data.empty:
@@ -407,17 +601,11 @@ class Identify:
         The large sell-off is often seen as an indication that the bulls are losing control of the market.
         """
 
-        # Lower wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["L-Wick"])
-        # Body within the 25th percentile
-        mask_short_body = (self.data["Body"] <= self.data["25 Body"])
-        # Local maximum
-        mask_maximum = (self.data["Max"] == True)
-
-        mask = mask_long_wick & mask_short_body & mask_maximum
+        mask = self.pattern_mask("hanging")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "hanging"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("hanging"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["hanging"]
 
         if self.printout:
             if filtered_data.empty:
@@ -438,19 +626,11 @@ class Identify:
         like a star falling to the ground.
         """
 
-        # Lower wick <= 25% of body
-        mask_short_wick = (0.25*self.data["Body"] >= self.data["L-Wick"])
-        # Upper wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["U-Wick"])
-        # Local maximum
-        mask_maximum = (self.data["Max"] == True)
-        # Candle has a red body
-        mask_green = (self.data["Open"] > self.data["Price"])
-
-        mask = mask_short_wick & mask_long_wick & mask_maximum & mask_green
+        mask = self.pattern_mask("shooting")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "shooting"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("shooting"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["shooting"]
 
         if self.printout:
             if filtered_data.empty:
@@ -472,20 +652,11 @@ class Identify:
         the more significant the trend is likely to be.
         """
 
-        # Second candle has a red body
-        mask_second_red = (self.data["Price"] < self.data["Open"])
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # First and second candles have short and long bodies (less than or greater than the 50th percentile)
-        mask_first_short = (self.data["Body"].shift(1) <= self.data["50 Body"])
-        mask_second_long = (self.data["Body"] >= self.data["50 Body"])
-        # First candle is engulfed by the second candle
-        mask_engulf = (self.data["Low"] < self.data["Low"].shift(1)) & (self.data["High"] > self.data["High"].shift(1))
-
-        mask = mask_first_green & mask_second_red & mask_first_short & mask_second_long & mask_engulf
+        mask = self.pattern_mask("bear_engulf")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "bear_engulf"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("bear_engulf"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["bear_engulf"]
 
         if self.printout:
             if filtered_data.empty:
@@ -505,20 +676,11 @@ class Identify:
         and is particularly strong when the third candlestick erases the gains of the first candle.
         """
 
-        # Third candle has a red body
-        mask_third_red = (self.data["Open"] > self.data["Price"])
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(2) > self.data["Open"].shift(2))
-        # First and third candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(2) >= self.data["50 Body"])
-        mask_third_long = (self.data["Body"] >= self.data["50 Body"])
-        # Second candle has a short body (less than the 25th percentile)
-        mask_second_short = (self.data["Body"].shift(1) <= self.data["25 Body"])
-
-        mask = mask_first_green & mask_third_red & mask_first_long & mask_third_long & mask_second_short
+        mask = self.pattern_mask("evening")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "evening"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("evening"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["evening"]
 
         if self.printout:
             if filtered_data.empty:
@@ -539,19 +701,11 @@ class Identify:
         as the sellers have overtaken the buyers during three successive trading days.
         """
 
-        # All three candles have a red body
-        mask_first_red = (self.data["Open"].shift(2) > self.data["Price"].shift(2))
-        mask_second_red = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        mask_third_red = (self.data["Open"] > self.data["Price"])
-        # All three with very small wicks
-        mask_first_wicks = (0.2*self.data["Body"].shift(2) >= self.data["L-Wick"].shift(2)) & (0.2*self.data["Body"].shift(2) >= self.data["U-Wick"].shift(2))
-        mask_second_wicks = (0.2*self.data["Body"].shift(1) >= self.data["L-Wick"].shift(1)) & (0.2*self.data["Body"].shift(1) >= self.data["U-Wick"].shift(1))
-        mask_third_wicks = (0.2*self.data["Body"] >= self.data["L-Wick"]) & (0.2*self.data["Body"] >= self.data["U-Wick"])
-
-        mask = mask_first_red & mask_second_red & mask_third_red & mask_first_wicks & mask_second_wicks & mask_third_wicks
+        mask = self.pattern_mask("crows")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "crows"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("crows"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["crows"]
 
         if self.printout:
             if filtered_data.empty:
@@ -573,19 +727,11 @@ class Identify:
         If the wicks of the candles are short it suggests that the downtrend was extremely decisive.
         """
 
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # Second candle has a red body
-        mask_second_red = (self.data["Open"] > self.data["Price"])
-        # Red candle opens above the previous green body
-        mask_red_open = (self.data["Open"] > self.data["Price"].shift(1))
-        # Red candle closes below the midpoint of the green body
-        mask_red_close = (self.data["Price"] < self.data["Open"].shift(1) + self.data["Body"].shift(1)/2)
-
-        mask = mask_first_green & mask_second_red & mask_red_open & mask_red_close
+        mask = self.pattern_mask("cloud")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "cloud"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("cloud"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["cloud"]
         
         if self.printout:
             if filtered_data.empty:
@@ -607,14 +753,11 @@ class Identify:
         but it can be found in reversal patterns such as the bullish morning star and bearish evening star.
         """
 
-        # Very small bodies
-        mask_first_body = (self.data["Body"].shift(1) < self.data["5 Body"].shift(1))
-        mask_second_body = (self.data["Body"] < self.data["5 Body"])
-
-        mask = mask_first_body & mask_second_body
+        mask = self.pattern_mask("doji")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "doji"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("doji"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["doji"]
 
         if self.printout:
             if filtered_data.empty:
@@ -638,17 +781,11 @@ class Identify:
         but they can be interpreted as a sign of things to come as it signifies that the current market pressure is losing control.
         """
 
-        # Short bodies
-        mask_first_body = (self.data["Body"].shift(1) < self.data["25 Body"].shift(1))
-        mask_second_body = (self.data["Body"] < self.data["25 Body"])
-        # Wicks with approximately equal length (less than 20% difference)
-        mask_first_wick = (abs(self.data["U-Wick"].shift(1) - self.data["L-Wick"].shift(1)) < 0.2*self.data["U-Wick"].shift(1))
-        mask_second_wick = (abs(self.data["U-Wick"] - self.data["L-Wick"]) < 0.2*self.data["U-Wick"])
-
-        mask = mask_first_body & mask_second_body & mask_first_wick & mask_second_wick
+        mask = self.pattern_mask("spinning")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "spinning"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("spinning"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["spinning"]
         
         if self.printout:
             if filtered_data.empty:
@@ -669,20 +806,11 @@ class Identify:
         It shows traders that the bulls do not have enough strength to reverse the trend.
         """
 
-        # First and last bodies are red
-        mask_red = (self.data["Open"].shift(4) > self.data["Price"].shift(4)) & (self.data["Open"] > self.data["Price"])
-        # Three bodies in the middle are all green
-        mask_green = (self.data["Price"].shift(3) > self.data["Open"].shift(3)) & (self.data["Price"].shift(2) > self.data["Open"].shift(2)) & (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # Green candles contained within the range of the red bodies
-        mask_contain_first = (np.minimum(self.data["Low"], self.data["Low"].shift(4)) < self.data["Low"].shift(3))
-        mask_contain_third = (np.maximum(self.data["High"], self.data["High"].shift(4)) > self.data["High"].shift(1))
-        # There is a falling trend
-        mask_falling = (self.data["Price"].shift(4) > self.data["Price"])
-
-        mask = mask_red & mask_green & mask_contain_first & mask_contain_third & mask_falling
+        mask = self.pattern_mask("falling")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "falling"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("falling"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["falling"]
 
         if self.printout:
             if filtered_data.empty:
@@ -700,20 +828,11 @@ class Identify:
         The pattern shows traders that, despite some selling pressure, buyers are retaining control of the market.
         """
 
-        # First and last bodies are green
-        mask_green = (self.data["Price"].shift(4) > self.data["Open"].shift(4)) & (self.data["Price"] > self.data["Open"])
-        # Three bodies in the middle are all red
-        mask_red = (self.data["Open"].shift(3) > self.data["Price"].shift(3)) & (self.data["Open"].shift(2) > self.data["Price"].shift(2)) & (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # Red candles contained within the range of the green bodies
-        mask_contain_first = (np.minimum(self.data["Low"], self.data["Low"].shift(4)) < self.data["Low"].shift(3))
-        mask_contain_third = (np.maximum(self.data["High"], self.data["High"].shift(4)) > self.data["High"].shift(1))
-        # There is a rising trend
-        mask_falling = (self.data["Price"] > self.data["Price"].shift(4))
-
-        mask = mask_red & mask_green & mask_contain_first & mask_contain_third & mask_falling
+        mask = self.pattern_mask("rising")
         filtered_data = self.data.loc[mask].copy()
         self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "rising"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        self.data.loc[mask, "Mask"] |= np.uint16(1 << patterns.index("rising"))
+        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = trends["rising"]
 
         if self.printout:
             if filtered_data.empty:
@@ -724,12 +843,17 @@ class Identify:
         
         return filtered_data
     
-    def monte_carlo(self, copies: int, plot: Optional[bool] = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def monte_carlo(self,
+                    copies: int,
+                    plot: Optional[bool] = True,
+                    seed: Optional[int] = SEED,
+                    workers: Optional[int] = None,
+                    method: Optional[str] = "block") -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
         Get Monte Carlo data and plot it
         """
 
-        all_data = resampled_data(self.country, copies, self.start_date, self.end_date)
+        all_data = resampled_data(self.country, copies, self.start_date, self.end_date, seed, workers=workers, dtype=self.dtype, method=method)
 
         if plot:
             multiple_candlestick(self.country, all_data, self.start_date)
@@ -0,0 +1,128 @@
+"""
+Bootstrap confidence intervals on the returns of the traders over the Monte Carlo copies
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+from statistics import NormalDist
+from typing import Optional
+from data import SEED
+
+def return_matrix(results: pd.DataFrame,
+                  metric: Optional[str] = "Return",
+                  synthetic_only: Optional[bool] = True) -> pd.DataFrame:
+    """
+    A metric of every trader as a (copies, traders) table, from the results table of Execute.evaluate,
+    by default leaving out the real data (DF == 0)
+    """
+
+    matrix = results.xs(metric, axis=1, level=1)
+    if synthetic_only:
+        matrix = matrix[matrix.index != 0]
+
+    return matrix
+
+def paired_differences(matrix: pd.DataFrame, baseline: Optional[str] = "hold") -> pd.DataFrame:
+    """
+    Difference between every other trader and the baseline trader on the same copy
+    """
+
+    others = [trader for trader in matrix.columns if trader != baseline]
+
+    return pd.DataFrame({trader + " - " + baseline: matrix[trader] - matrix[baseline] for trader in others}, index=matrix.index)
+
+def bootstrap_means(values: np.ndarray,
+                    draws: Optional[int] = 10000,
+                    chunk_size: Optional[int] = None,
+                    seed: Optional[int] = SEED) -> np.ndarray:
+    """
+    Bootstrap distribution of the mean of every column of a (copies, columns) array, as a (draws, columns) array
+    Each chunk of draws resamples the copies through one (draws, copies) matrix of random indices,
+    sized to keep about 10 million indices in memory at a time,
+    which is turned into counts of each copy so that all columns are averaged with a single matrix product
+    """
+
+    n = values.shape[0]
+    chunk_size = max(1, 10**7 // n) if chunk_size is None else chunk_size
+    rng = np.random.default_rng(seed)
+    means = np.empty((draws, values.shape[1]))
+
+    for start in range(0, draws, chunk_size):
+        rows = min(chunk_size, draws - start)
+        index = rng.integers(0, n, size=(rows, n))
+        index += np.arange(rows)[:, None] * n
+        counts = np.bincount(index.ravel(), minlength=rows * n).reshape(rows, n)
+        means[start : start + rows] = counts @ values / n
+
+    return means
+
+def bca_interval(values: np.ndarray,
+                 means: np.ndarray,
+                 confidence: Optional[float] = 0.95) -> np.ndarray:
+    """
+    Bias-corrected and accelerated confidence interval on the mean of every column,
+    from the bootstrap means and the jackknife, which has a closed form for the mean
+    Returns a (2, columns) array of lower and upper bounds
+    """
+
+    n = values.shape[0]
+    estimate = values.mean(axis=0)
+    normal = NormalDist()
+
+    # Bias correction from the share of bootstrap means below the estimate
+    below = (means < estimate).mean(axis=0) + 0.5 * (means == estimate).mean(axis=0)
+    # Acceleration from the skew of the leave-one-out means
+    jackknife = (values.sum(axis=0) - values) / (n - 1)
+    spread = jackknife.mean(axis=0) - jackknife
+    with np.errstate(invalid="ignore", divide="ignore"):
+        acceleration = (spread**3).sum(axis=0) / (6 * ((spread**2).sum(axis=0))**1.5)
+
+    result = np.full((2, values.shape[1]), np.nan)
+    for j in range(values.shape[1]):
+        if not 0 < below[j] < 1 or np.isnan(acceleration[j]):
+            # Degenerate bootstrap distribution, e.g. every copy gives the same value
+            result[:, j] = np.quantile(means[:, j], [(1 - confidence) / 2, (1 + confidence) / 2])
+            continue
+        z0 = normal.inv_cdf(below[j])
+        for i, alpha in enumerate([(1 - confidence) / 2, (1 + confidence) / 2]):
+            z = z0 + normal.inv_cdf(alpha)
+            result[i, j] = np.quantile(means[:, j], normal.cdf(z0 + z / (1 - acceleration[j] * z)))
+
+    return result
+
+def bootstrap_summary(results: pd.DataFrame,
+                      metric: Optional[str] = "Return",
+                      baseline: Optional[str] = "hold",
+                      draws: Optional[int] = 10000,
+                      confidence: Optional[float] = 0.95,
+                      quantiles: Optional[list] = [0.05, 0.25, 0.50, 0.75, 0.95],
+                      seed: Optional[int] = SEED,
+                      printout: Optional[bool] = False) -> pd.DataFrame:
+    """
+    Distribution of a metric over the synthetic copies for every trader and for every trader's
+    paired difference to the baseline: mean, standard deviation, quantiles, the share of copies above zero,
+    and a BCa bootstrap confidence interval on the mean
+    """
+
+    matrix = return_matrix(results, metric)
+    if baseline in matrix.columns:
+        matrix = pd.concat([matrix, paired_differences(matrix, baseline)], axis=1)
+    values = matrix.to_numpy(dtype=float)
+
+    means = bootstrap_means(values, draws, seed=seed)
+    lower, upper = bca_interval(values, means, confidence)
+
+    summary = pd.DataFrame({"Mean": values.mean(axis=0),
+                            "Std": values.std(axis=0, ddof=1),
+                            **{f"{int(q*100)}%": np.quantile(values, q, axis=0) for q in quantiles},
+                            "Positive": (values > 0).mean(axis=0),
+                            "Lower": lower,
+                            "Upper": upper}, index=matrix.columns)
+
+    if printout:
+        print("{} over {} copies with {:.0f}% BCa intervals from {} bootstrap draws:".format(metric, len(values), confidence * 100, draws))
+        print(summary)
+
+    return summary
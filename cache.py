@@ -0,0 +1,110 @@
+"""
+Cache covariates so that repeated or overlapping runs skip recomputation
+"""
+
+# Import libraries
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from typing import Optional
+
+class CovariateCache:
+    """
+    Content-addressed least-recently-used cache of covariates,
+    keyed by a hash of the OHLC values and the covariate parameters,
+    with an optional tier of pickled files on disk
+    """
+
+    def __init__(self,
+                 max_bytes: Optional[int] = 256 * 2**20,
+                 directory: Optional[str] = None) -> None:
+
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits, self.misses = 0, 0
+        # Identify objects analysed in different threads may share the cache
+        self.lock = threading.RLock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self) -> dict:
+        # Do not drag the in-memory entries along when pickling objects that hold the cache
+        state = self.__dict__.copy()
+        state["entries"], state["size"] = OrderedDict(), 0
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def key(self, data: pd.DataFrame, **params) -> str:
+        """
+        Hash of the OHLC values of a single series and the parameters used on it
+        """
+
+        h = hashlib.sha256()
+        for col in ["Price", "Open", "High", "Low"]:
+            h.update(np.ascontiguousarray(data[col].to_numpy(dtype=float)).tobytes())
+        h.update(repr(sorted(params.items())).encode())
+
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Look up covariates in memory, then on disk
+        """
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            if self.directory is not None:
+                filename = os.path.join(self.directory, key + ".pkl")
+                if os.path.exists(filename):
+                    value = pd.read_pickle(filename)
+                    self.put(key, value, write=False)
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: pd.DataFrame, write: Optional[bool] = True) -> None:
+        """
+        Store covariates, evicting the least recently used entries when over the memory limit
+        """
+
+        value = value.reset_index(drop=True)
+        with self.lock:
+            if key not in self.entries:
+                self.size += value.memory_usage(index=False).sum()
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.memory_usage(index=False).sum()
+
+        if write and self.directory is not None:
+            value.to_pickle(os.path.join(self.directory, key + ".pkl"))
+
+    def clear(self) -> None:
+        """
+        Empty the in-memory tier
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+# Cache shared by every Identify object unless told otherwise
+default_cache = CovariateCache()
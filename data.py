@@ -3,13 +3,17 @@ Import and read data, and convert it to a Pandas dataframe
 """
 
 # Import libraries
-import random
+import math
+import bisect
 import numpy as np
 import pandas as pd
-from typing import Optional
+from itertools import repeat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
 
-random.seed(0)
-np.random.seed(0)
+# Root seed that every Monte Carlo copy's random stream is spawned from
+SEED = 0
 
 def read_local_file(filename: str, confirm: Optional[bool] = True):
     """
@@ -33,6 +37,87 @@ def read_local_file(filename: str, confirm: Optional[bool] = True):
         print("Error: File not found or invalid")
         return None
 
+def read_chunks(filename: str,
+                columns: list,
+                chunksize: int,
+                engine: Optional[str] = "pandas"):
+    """
+    Yield a large CSV file as a sequence of dataframes of bounded size
+    """
+
+    if engine == "pyarrow":
+        import pyarrow.csv as pv
+        # pyarrow reads blocks of bytes rather than rows, so allow roughly 32 bytes per row
+        reader = pv.open_csv(filename,
+                             read_options=pv.ReadOptions(block_size=32 * chunksize),
+                             convert_options=pv.ConvertOptions(include_columns=columns))
+        for batch in reader:
+            yield batch.to_pandas()
+    elif engine == "pandas":
+        yield from pd.read_csv(filename, usecols=columns, chunksize=chunksize)
+    else:
+        raise Exception("Error: Engine not recognised")
+
+def read_tick_file(filename: str,
+                   frequency: Optional[str] = "1D",
+                   chunksize: Optional[int] = 1000000,
+                   date_column: Optional[str] = "Date",
+                   price_column: Optional[str] = "Price",
+                   date_format: Optional[str] = None,
+                   engine: Optional[str] = "pandas") -> pd.DataFrame:
+    """
+    Stream a large, chronologically ordered tick (or intraday bar) file in chunks,
+    aggregating it into OHLC bars of the given frequency as it goes
+    Returns the same cleaned schema as the investing.com data, ready to pass to Identify as import_df
+    """
+
+    bars = []
+    carry = None
+
+    for chunk in read_chunks(filename, [date_column, price_column], chunksize, engine):
+        chunk = chunk.dropna()
+        if chunk.empty:
+            continue
+        times = pd.to_datetime(chunk[date_column], format=date_format)
+        try:
+            keys = times.dt.floor(frequency).to_numpy()
+        except ValueError:
+            # Weeks and months are not fixed frequencies
+            keys = times.dt.to_period(frequency).dt.start_time.to_numpy()
+        prices = chunk[price_column].to_numpy(dtype=float)
+        if np.any(keys[1:] < keys[:-1]) or (carry is not None and keys[0] < carry[0]):
+            raise Exception("Error: Tick file must be in chronological order")
+
+        # One grouped reduction over the runs of equal bar keys
+        starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+        ends = np.concatenate([starts[1:], [len(keys)]]) - 1
+        chunk_bars = [keys[starts], prices[starts], np.maximum.reduceat(prices, starts),
+                      np.minimum.reduceat(prices, starts), prices[ends]]
+
+        # The last bar of the previous chunk may continue into this one
+        if carry is not None:
+            if carry[0] == chunk_bars[0][0]:
+                chunk_bars[1][0] = carry[1]
+                chunk_bars[2][0] = max(carry[2], chunk_bars[2][0])
+                chunk_bars[3][0] = min(carry[3], chunk_bars[3][0])
+            else:
+                bars.append([np.array([value]) for value in carry])
+
+        # Keep the last bar open until we know it is complete
+        bars.append([column[:-1] for column in chunk_bars])
+        carry = [column[-1] for column in chunk_bars]
+
+    if carry is not None:
+        bars.append([np.array([value]) for value in carry])
+    if not bars:
+        raise Exception("Error: No ticks found in " + filename)
+
+    date, open_price, high, low, close = [np.concatenate([chunk[i] for chunk in bars]) for i in range(5)]
+    data = pd.DataFrame({"Date": date, "Price": close, "Open": open_price, "High": high, "Low": low})
+    data["Change %"] = (100 * data["Price"].pct_change()).fillna(0)
+
+    return data
+
 def check_bad_values(data: pd.DataFrame) -> pd.DataFrame:
     """
     Check for null or missing values and delete them
@@ -63,6 +148,18 @@ def correct_changes(data: pd.DataFrame) -> pd.DataFrame:
 
     return data
 
+def set_precision(data: pd.DataFrame, dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Cast the price and change columns to 'dtype' (e.g. 'float32'),
+    leaving the data unchanged when no dtype is given
+    """
+
+    if dtype is not None:
+        for col in ["Price", "Open", "High", "Low", "Change %"]:
+            data[col] = data[col].astype(dtype)
+
+    return data
+
 def check_date(date: str) -> None:
     """
     Make sure the string input date is valid,
@@ -86,20 +183,108 @@ def check_date(date: str) -> None:
     if valid == False:
         raise Exception("Error: Invalid date entered")
 
+def date_slice(dates: np.ndarray, start_date: pd.Timestamp, end_date: pd.Timestamp) -> slice:
+    """
+    Positions of a sorted array of dates between the start and end dates (inclusive),
+    found by binary search
+    """
+
+    start = np.searchsorted(dates, start_date.to_datetime64(), side="left")
+    end = np.searchsorted(dates, end_date.to_datetime64(), side="right")
+
+    return slice(start, end)
+
+def copy_offsets(data: pd.DataFrame) -> np.ndarray:
+    """
+    Start and end positions of each Monte Carlo copy in the stacked dataframe,
+    taken from data.attrs["offsets"] as kept by resampled_data and filter_data when they still fit the frame,
+    and otherwise found by scanning the "DF" column
+    """
+
+    ids = data["DF"].to_numpy()
+    offsets = np.array(data.attrs.get("offsets", ()), dtype=np.int64).reshape(-1, 2)
+
+    # Only the boundaries are checked, so that the stored offsets are used without scanning every row
+    if len(offsets) and offsets[0, 0] == 0 and offsets[-1, 1] == len(ids):
+        starts, ends = offsets[:, 0], offsets[:, 1]
+        if (np.all(ends > starts) and np.all(starts[1:] == ends[:-1])
+                and np.all(ids[starts] == ids[ends - 1]) and np.all(ids[starts[1:]] != ids[ends[:-1] - 1])):
+            return offsets
+
+    starts = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+
+    return np.stack([starts, np.concatenate([starts[1:], [len(ids)]])], axis=1)
+
+def store_offsets(data: pd.DataFrame, lengths: list) -> pd.DataFrame:
+    """
+    Keep the positions of the Monte Carlo copies, of the given lengths, in the dataframe's attrs
+    Offsets are kept as a tuple, as Pandas compares the attrs of frames when concatenating them
+    """
+
+    ends = np.cumsum([n for n in lengths if n > 0], dtype=np.int64)
+    starts = np.concatenate([[0], ends[:-1]])
+    data.attrs = {**data.attrs, "offsets": tuple(zip(starts.tolist(), ends.tolist()))}
+
+    return data
+
 def filter_data(data: pd.DataFrame,
                 start_date: str,
                 end_date: str) -> pd.DataFrame:
     """
     Filter data by dates
+    Data must be sorted by date (within each Monte Carlo copy),
+    so that each copy is sliced by binary search rather than masking every row
+    The result is a slice of the data, without copying, whenever the rows kept are contiguous
     """
 
     start_date = pd.to_datetime(start_date, format="%Y-%m-%d")
     end_date = pd.to_datetime(end_date, format="%Y-%m-%d")
-    mask = (data["Date"] >= start_date) & (data["Date"] <= end_date)
-    filtered_data = data.loc[mask]
+    dates = data["Date"].to_numpy()
+
+    if "DF" in data.columns:
+        kept = []
+        for start, end in copy_offsets(data):
+            window = date_slice(dates[start:end], start_date, end_date)
+            kept.append((start + window.start, start + window.stop))
+        kept = [(start, end) for start, end in kept if end > start]
+        if not kept:
+            filtered_data = data.iloc[:0]
+        elif all(start == end for (_, end), (start, _) in zip(kept[:-1], kept[1:])):
+            filtered_data = data.iloc[kept[0][0] : kept[-1][1]]
+        else:
+            filtered_data = data.iloc[np.concatenate([np.arange(start, end) for start, end in kept])]
+        filtered_data = store_offsets(filtered_data, [end - start for start, end in kept])
+    else:
+        filtered_data = data.iloc[date_slice(dates, start_date, end_date)]
 
     return filtered_data
 
+def resample_ohlc(data: pd.DataFrame, frequency: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Build lower frequency (e.g. weekly "W" or monthly "M") candles from daily data in one grouped reduction,
+    also returning the position of each day's candle in the new dataframe
+    Candles are dated by their last trading day, when they are complete
+    """
+
+    keys = pd.PeriodIndex(data["Date"], freq=frequency).asi8
+    copies = data["DF"].to_numpy() if "DF" in data.columns else np.zeros(len(data), dtype=int)
+    change = (keys[1:] != keys[:-1]) | (copies[1:] != copies[:-1])
+    starts = np.concatenate([[0], np.flatnonzero(change) + 1])
+    ends = np.concatenate([starts[1:], [len(keys)]]) - 1
+    groups = np.cumsum(np.concatenate([[False], change]))
+
+    bars = pd.DataFrame({"Date": data["Date"].to_numpy()[ends],
+                         "Price": data["Price"].to_numpy()[ends],
+                         "Open": data["Open"].to_numpy()[starts],
+                         "High": np.maximum.reduceat(data["High"].to_numpy(), starts),
+                         "Low": np.minimum.reduceat(data["Low"].to_numpy(), starts)})
+    bars["Change %"] = (100 * bars["Price"].pct_change()).fillna(0)
+    if "DF" in data.columns:
+        bars["DF"] = copies[starts]
+        bars.loc[bars["DF"].diff() != 0, "Change %"] = 0.0
+
+    return bars, groups
+
 def asym_rolling_minmax(data: pd.DataFrame,
                         look_back: int,
                         look_forward: int,
@@ -122,35 +307,131 @@ def asym_rolling_minmax(data: pd.DataFrame,
 
     return result
 
+def sorted_quantiles(values: list,
+                     quantiles: Optional[list] = [0.25, 0.50, 0.75]) -> list:
+    """
+    Linearly interpolated quantiles of an already sorted list,
+    matching the values given by Pandas
+    """
+
+    n = len(values)
+    if n == 0:
+        return [np.nan] * len(quantiles)
+
+    result = []
+    for q in quantiles:
+        position = (n - 1) * q
+        lower = math.floor(position)
+        if position >= n - 1:
+            result.append(values[-1])
+            continue
+        a, b, t = values[lower], values[lower + 1], position - lower
+        # Interpolate from the nearest end, as NumPy does
+        result.append(b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t)
+
+    return result
+
 def expanding_quantiles(data: pd.DataFrame,
                         column: str,
-                        quantiles: Optional[list] = [0.25, 0.50, 0.75]) -> pd.DataFrame:
+                        quantiles: Optional[list] = [0.25, 0.50, 0.75],
+                        state: Optional[list] = None,
+                        dtype: Optional[str] = 'float') -> pd.DataFrame:
     """
     Calculate quantiles for a specific column called "column"
     Data is time-consistent, i.e. we only use data up to that point in time
+    The sorted values seen so far are kept in 'state', which can be passed back in to extend the quantiles to new rows
     """
 
-    result = pd.DataFrame(index = data.index, columns=[f"{int(q*100)}" + " " + column for q in quantiles], dtype='float')
+    values = [] if state is None else state
+    rows = []
+
+    for x in data[column]:
+        if not np.isnan(x):
+            bisect.insort(values, x)
+        rows.append(sorted_quantiles(values, quantiles))
 
-    for i in range(1, len(data) + 1):
-        result.iloc[i - 1] = data[column].iloc[:i].quantile(quantiles).values
+    result = pd.DataFrame(rows, index=data.index, columns=[f"{int(q*100)}" + " " + column for q in quantiles], dtype=dtype)
     
     return result
 
-def shuffle_with_window_size(values: list, window_size: int) -> list:
+def expanding_quantile_matrix(values: np.ndarray,
+                              quantiles: Optional[list] = [0.25, 0.50, 0.75],
+                              dtype: Optional[str] = 'float') -> np.ndarray:
+    """
+    Expanding quantiles of every row of a (series, days) array at once, skipping NaN,
+    as a (quantiles, series, days) array with the same values as expanding_quantiles on each row
+    The two order statistics around each quantile come from Pandas over all columns at once,
+    and are interpolated as in sorted_quantiles
+    """
+
+    window = pd.DataFrame(values.T).expanding(min_periods=1)
+    n = np.cumsum(~np.isnan(values), axis=1)
+    result = np.empty((len(quantiles),) + values.shape, dtype=dtype)
+
+    for i, q in enumerate(quantiles):
+        a = window.quantile(q, interpolation="lower").to_numpy().T
+        b = window.quantile(q, interpolation="higher").to_numpy().T
+        position = (n - 1) * q
+        t = position - np.floor(position)
+        result[i] = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+
+    return result
+
+def rolling_quantiles(data: pd.DataFrame,
+                      column: str,
+                      window: int,
+                      quantiles: Optional[list] = [0.25, 0.50, 0.75],
+                      state: Optional[tuple] = None,
+                      dtype: Optional[str] = 'float') -> pd.DataFrame:
+    """
+    Calculate quantiles for a specific column called "column" over the last 'window' rows
+    Data is time-consistent, i.e. we only use data up to that point in time
+    The sorted values are updated by inserting the newest and evicting the oldest value of the window,
+    and the (sorted values, window values) pair is kept in 'state', which can be passed back in to extend the quantiles to new rows
+    """
+
+    values, recent = ([], deque()) if state is None else state
+    rows = []
+
+    for x in data[column]:
+        recent.append(x)
+        if not np.isnan(x):
+            bisect.insort(values, x)
+        if len(recent) > window:
+            old = recent.popleft()
+            if not np.isnan(old):
+                del values[bisect.bisect_left(values, old)]
+        rows.append(sorted_quantiles(values, quantiles))
+
+    result = pd.DataFrame(rows, index=data.index, columns=[f"{int(q*100)}" + " " + column for q in quantiles], dtype=dtype)
+
+    return result
+
+def copy_generator(copy: int, seed: Optional[int] = SEED) -> np.random.Generator:
+    """
+    Independent random generator for Monte Carlo copy number 'copy',
+    the same stream as the copy'th child spawned from 'seed'
+    """
+
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(copy,)))
+
+def shuffle_with_window_size(values: list,
+                             window_size: int,
+                             rng: Optional[np.random.Generator] = None) -> list:
     """
     Shuffle a list, while maintaining consecutive values of length 'window size'
     """
 
+    rng = np.random.default_rng() if rng is None else rng
     chunks = [values[i : i + window_size] for i in range(0, len(values), window_size)]
-    random.shuffle(chunks)
-    shuffled_list = [item for chunk in chunks for item in chunk]
+    order = rng.permutation(len(chunks))
+    shuffled_list = [item for i in order for item in chunks[i]]
     
     return shuffled_list
 
-def resampled_data(country: str, copies: int, start_date: str, end_date: str) -> pd.DataFrame:
+def read_clean_data(country: str) -> pd.DataFrame:
     """
-    Monte Carlo inspired method for producing synthetic data over all OHLC values 
+    Read, clean and sort the real data for a country
     """
 
     filename = country + "-bond-yield.csv"
@@ -162,34 +443,161 @@ def resampled_data(country: str, copies: int, start_date: str, end_date: str) ->
         correct_dates(df)
         correct_changes(df)
         df.sort_values(["Date"], ignore_index=True, inplace=True)
-    
+
+    return df
+
+def resample_copy(df: pd.DataFrame,
+                  copy: int,
+                  seed: Optional[int] = SEED,
+                  dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Produce Monte Carlo copy number 'copy' of the real data,
+    which is always the same for a given seed however the copies are generated
+    """
+
+    rng = copy_generator(copy, seed)
+    new_df = df.copy()
+    for col in ["Open", "High", "Low"]:
+        new_df[col] = new_df[col] / new_df["Price"]
+    returns = new_df["Price"].pct_change().values[1:]
+    returns = np.array(shuffle_with_window_size(returns, 10, rng))
+    # Compound the shuffled changes from the first real price
+    new_df["Price"] = np.cumprod(np.concatenate([[df.loc[0, "Price"]], 1 + returns]))
+    for col in ["Open", "High", "Low"]:
+        new_df[col] = new_df[col] * new_df["Price"]
+    new_df["Change %"] = 100 * new_df["Price"].pct_change()
+    new_df["Change %"] = new_df["Change %"].fillna(0)
+    new_df["DF"] = copy
+
+    return set_precision(new_df, dtype)
+
+def block_regimes(returns: np.ndarray,
+                  window_size: Optional[int] = 10,
+                  regimes: Optional[int] = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Label every full block of 'window size' consecutive returns by the bucket of its volatility,
+    from 0 for the calmest to regimes - 1 for the most volatile,
+    along with the Markov matrix of transitions from one block's regime to the next
+    """
+
+    blocks = returns[:len(returns) // window_size * window_size].reshape(-1, window_size)
+    volatility = blocks.std(axis=1)
+    labels = np.searchsorted(np.quantile(volatility, np.linspace(0, 1, regimes + 1)[1:-1]), volatility, side="right")
+
+    counts = np.zeros((regimes, regimes))
+    np.add.at(counts, (labels[:-1], labels[1:]), 1)
+    # Regimes never left (e.g. only seen in the last block) move anywhere with equal probability
+    counts[counts.sum(axis=1) == 0] = 1
+
+    return labels, counts / counts.sum(axis=1, keepdims=True)
+
+def resample_regime_copies(df: pd.DataFrame,
+                           copy_ids: list,
+                           seed: Optional[int] = SEED,
+                           dtype: Optional[str] = None,
+                           window_size: Optional[int] = 10,
+                           regimes: Optional[int] = 3) -> pd.DataFrame:
+    """
+    Produce Monte Carlo copies of the real data whose blocks of returns follow a Markov chain of volatility regimes,
+    so that calm and volatile spells cluster as in the real data
+    Starting in the regime of the first real block, each step draws the next regime from the transition matrix
+    and then a block of that regime, with replacement
+    Every copy takes its random numbers from its own generator, so copy k is the same whichever copies are produced,
+    while the chain itself steps through all copies at once
+    """
+
+    returns = df["Price"].pct_change().to_numpy()[1:]
+    labels, transition = block_regimes(returns, window_size, regimes)
+    members = [np.flatnonzero(labels == r) for r in range(regimes)]
+    counts = np.array([len(m) for m in members])
+    table = np.zeros((regimes, counts.max()), dtype=int)
+    for r, m in enumerate(members):
+        table[r, :len(m)] = m
+
+    n_blocks = -(-len(returns) // window_size)
+    uniforms = np.stack([copy_generator(copy, seed).random((n_blocks, 2)) for copy in copy_ids])
+    cumulative = np.cumsum(transition, axis=1)
+    state = np.full(len(copy_ids), labels[0])
+    chosen = np.empty((len(copy_ids), n_blocks), dtype=int)
+
+    for t in range(n_blocks):
+        if t > 0:
+            state = np.minimum((uniforms[:, t, :1] > cumulative[state]).sum(axis=1), regimes - 1)
+        pick = np.minimum((uniforms[:, t, 1] * counts[state]).astype(int), counts[state] - 1)
+        chosen[:, t] = table[state, pick]
+
+    # Gather the returns of the chosen blocks and compound them from the first real price
+    index = (chosen[:, :, None] * window_size + np.arange(window_size)).reshape(len(copy_ids), -1)[:, :len(returns)]
+    prices = df.loc[0, "Price"] * np.cumprod(np.concatenate([np.ones((len(copy_ids), 1)), 1 + returns[index]], axis=1), axis=1)
+
+    new_df = pd.concat([df] * len(copy_ids))
+    price = prices.ravel()
+    for col in ["Open", "High", "Low"]:
+        new_df[col] = np.tile((df[col] / df["Price"]).to_numpy(), len(copy_ids)) * price
+    new_df["Price"] = price
+    change = np.zeros(prices.shape)
+    change[:, 1:] = 100 * (prices[:, 1:] / prices[:, :-1] - 1)
+    new_df["Change %"] = change.ravel()
+    new_df["DF"] = np.repeat(copy_ids, len(df))
+
+    return set_precision(new_df, dtype)
+
+def resampled_data(country: str,
+                   copies: int,
+                   start_date: str,
+                   end_date: str,
+                   seed: Optional[int] = SEED,
+                   copy_ids: Optional[list] = None,
+                   include_real: Optional[bool] = True,
+                   workers: Optional[int] = None,
+                   dtype: Optional[str] = None,
+                   method: Optional[str] = "block") -> pd.DataFrame:
+    """
+    Monte Carlo inspired method for producing synthetic data over all OHLC values 
+    Copies are numbered 1 to 'copies' unless 'copy_ids' are given, and can be generated over several worker processes
+    Setting 'dtype' to 'float32' halves the memory taken by the price columns
+    The 'block' method shuffles blocks of returns uniformly, while the 'regime' method samples them
+    conditionally on the previous block's volatility regime, for all copies at once
+    """
+
+    df = read_clean_data(country)
     df["DF"] = 0
-    dataframes = [df.copy()]
-
-    for i in range(copies):
-        new_df = df.copy()
-        for col in ["Open", "High", "Low"]:
-            new_df[col] = new_df[col] / new_df["Price"]
-        new_df["Price"] = new_df["Price"].pct_change()
-        #new_df.loc[1:, "Price"] = np.random.permutation(new_df.loc[1:, "Price"].values)
-        new_df.loc[1:, "Price"] = shuffle_with_window_size(new_df.loc[1:, "Price"].values, 10)
-        new_df.loc[0, "Price"] = df.loc[0, "Price"]
-        for j in range(1, len(new_df)):
-            new_df.at[j, "Price"] = (1 + new_df.at[j, "Price"]) * new_df.at[j - 1, "Price"]
-        for col in ["Open", "High", "Low"]:
-            new_df[col] = new_df[col] * new_df["Price"]
-        new_df["Change %"] = 100 * new_df["Price"].pct_change()
-        new_df["Change %"] = new_df["Change %"].fillna(0)
-        new_df["DF"] = i + 1
-        dataframes.append(new_df)
+    ids = range(1, copies + 1) if copy_ids is None else copy_ids
+    # Every copy shares the real calendar, so find the dates once and slice each copy before stacking
+    window = date_slice(df["Date"].to_numpy(), pd.to_datetime(start_date), pd.to_datetime(end_date))
+    dataframes = [set_precision(df.iloc[window].copy(), dtype)] if include_real else []
+
+    if method == "regime":
+        regime_df = resample_regime_copies(df, list(ids), seed, dtype)
+        dataframes += [regime_df.iloc[i * len(df) : (i + 1) * len(df)].iloc[window] for i in range(len(ids))]
+    elif method != "block":
+        raise Exception("Error: Resampling method not recognised")
+    elif workers is not None and workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            dataframes += [new_df.iloc[window] for new_df in pool.map(resample_copy, repeat(df), ids, repeat(seed), repeat(dtype))]
+    else:
+        dataframes += [resample_copy(df, i, seed, dtype).iloc[window] for i in ids]
     
-    df_combined = pd.concat(dataframes)
-
-    mask = (df_combined["Date"] >= start_date) & (df_combined["Date"] <= end_date)
-    df_combined = df_combined.loc[mask]
+    df_combined = store_offsets(pd.concat(dataframes), [len(new_df) for new_df in dataframes])
 
     return df_combined
 
+def stack_copies(data: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    Reshape a column of the stacked Monte Carlo dataframe into a (copies, days) array
+    """
+
+    values = data[column].to_numpy()
+    if "DF" not in data.columns:
+        return values.reshape(1, -1)
+
+    ids = data["DF"].to_numpy()
+    copies = len(np.unique(ids))
+    if len(values) % copies != 0 or np.any(np.diff(ids) < 0):
+        raise Exception("Error: Monte Carlo copies must be contiguous and of equal length")
+
+    return values.reshape(copies, -1)
+
 def count_patterns(df: pd.DataFrame) -> list:
     """
     Count how many patterns are identified for each Monte Carlo shuffle
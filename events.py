@@ -0,0 +1,130 @@
+"""
+Event study of candlestick patterns over forward horizons
+"""
+
+# Import libraries
+import warnings
+import numpy as np
+import pandas as pd
+
+from typing import Optional, Tuple
+from analysis import patterns, extremum_patterns, trends
+from data import stack_copies
+
+def pattern_bits(data: pd.DataFrame) -> np.ndarray:
+    """
+    Unpack the "Mask" column into a (copies, days, patterns) boolean array,
+    true wherever a pattern was found on a bar, even if a later pattern took its "Pattern" label
+    """
+
+    masks = stack_copies(data, "Mask").astype(np.uint16)
+
+    return ((masks[..., None] >> np.arange(len(patterns), dtype=np.uint16)) & 1).astype(bool)
+
+def trend_directions(data: pd.DataFrame) -> np.ndarray:
+    """
+    Direction every pattern predicts on every day, as a (days, patterns) array,
+    continuation patterns take the direction of the day's own move
+    """
+
+    direction = np.tile([{"up": 1.0, "down": -1.0}.get(trends[name], 0.0) for name in patterns], (len(data), 1))
+    cont = [trends[name] == "cont" for name in patterns]
+    direction[:, cont] = np.sign(data["Change %"].to_numpy(dtype=float))[:, None]
+
+    return direction
+
+def pattern_delays(look_forward: Optional[int] = 1) -> np.ndarray:
+    """
+    Number of bars after its own bar until each pattern (by code) is known,
+    look_forward for the patterns that need a confirmed local extremum and 0 for the rest
+    """
+
+    return np.array([look_forward if name in extremum_patterns else 0 for name in patterns])
+
+def event_returns(data: pd.DataFrame,
+                  horizons: Optional[int] = 10,
+                  look_forward: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-copy event counts, mean forward change in yield, average move and hit rate,
+    as (copies, patterns, horizons) arrays, along with the copy ids
+    The forward window of an event starts at the close of the bar on which its pattern becomes known,
+    i.e. look_forward bars after the pattern's own bar for patterns that need a local extremum (see pattern_delays),
+    so that no event uses prices it could not have seen
+    """
+
+    price = stack_copies(data, "Price").astype(float)
+    bits = pattern_bits(data)
+    direction = trend_directions(data).reshape(bits.shape)
+    ids = np.unique(data["DF"]) if "DF" in data.columns else np.array([0])
+    copies, n_patterns = price.shape[0], len(patterns)
+
+    # Every pattern found on a bar is an event, not only the one holding its "Pattern" label
+    # Gather the forward window of every event in one go from a strided view,
+    # padding the end of each copy so that horizons past the last day are NaN
+    padded = np.concatenate([price, np.full((copies, horizons + look_forward), np.nan)], axis=1)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, horizons + 1, axis=1)
+    rows, cols, codes = np.nonzero(bits)
+    events = windows[rows, cols + pattern_delays(look_forward)[codes]]
+    forward = events[:, 1:] - events[:, :1]
+    valid = ~np.isnan(forward)
+    hits = valid & (np.sign(forward) == direction[rows, cols, codes][:, None])
+
+    # Accumulate per (copy, pattern) for all horizons at once
+    key = rows * n_patterns + codes
+    shape = (copies * n_patterns, horizons)
+    count, total, moves, hit = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    np.add.at(count, key, valid)
+    np.add.at(total, key, np.where(valid, forward, 0.0))
+    np.add.at(moves, key, np.where(valid, abs(forward), 0.0))
+    np.add.at(hit, key, hits)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (total / count).reshape(copies, n_patterns, horizons)
+        move = (moves / count).reshape(copies, n_patterns, horizons)
+        rate = (hit / count).reshape(copies, n_patterns, horizons)
+
+    return count.reshape(copies, n_patterns, horizons), mean, move, rate, ids
+
+def event_study(data: pd.DataFrame,
+                horizons: Optional[int] = 10,
+                confidence: Optional[float] = 0.95,
+                printout: Optional[bool] = False,
+                look_forward: Optional[int] = 1) -> pd.DataFrame:
+    """
+    Forward change in yield, average move and hit rate after every pattern,
+    for horizons of 1 to 'horizons' days from the close of the bar on which the pattern is known,
+    and across all Monte Carlo copies
+    """
+
+    count, mean, move, rate, ids = event_returns(data, horizons, look_forward)
+    copies, n_patterns = count.shape[0], len(patterns)
+
+    index = pd.MultiIndex.from_product([patterns, range(1, horizons + 1)], names=["Pattern", "Horizon"])
+    result = pd.DataFrame(index=index)
+    real, synthetic = (ids == 0), (ids != 0)
+    empty = np.full(n_patterns * horizons, np.nan)
+
+    result["Events"] = count[real].sum(axis=0).ravel() if real.any() else empty
+    result["Return"] = mean[real][0].ravel() if real.any() else empty
+    result["Move"] = move[real][0].ravel() if real.any() else empty
+    result["Hit Rate"] = rate[real][0].ravel() if real.any() else empty
+
+    # Confidence bands are taken across the synthetic copies
+    lower, upper = (1 - confidence) / 2, 1 - (1 - confidence) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if synthetic.any():
+            result["MC Events"] = count[synthetic].mean(axis=0).ravel()
+            result["MC Return"] = np.nanmean(mean[synthetic], axis=0).ravel()
+            result["MC Lower"] = np.nanquantile(mean[synthetic], lower, axis=0).ravel()
+            result["MC Upper"] = np.nanquantile(mean[synthetic], upper, axis=0).ravel()
+            result["MC Move"] = np.nanmean(move[synthetic], axis=0).ravel()
+            result["MC Hit Rate"] = np.nanmean(rate[synthetic], axis=0).ravel()
+            result["MC Hit Lower"] = np.nanquantile(rate[synthetic], lower, axis=0).ravel()
+            result["MC Hit Upper"] = np.nanquantile(rate[synthetic], upper, axis=0).ravel()
+
+    if printout:
+        print("Event study over {} copies and {} day horizons:".format(copies, horizons))
+        print(result[result["Events"] > 0] if real.any() else result)
+
+    return result
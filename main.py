@@ -4,37 +4,16 @@ PyCandleStrat
 MIT License 2024
 """
 
-from analysis import Identify
-from trading import Execute
+from pipeline import main
 
 #######################
-##### GLOBAL VARS #####
+####### PIPELINE ######
 #######################
 
-COUNTRY = "US"
-PATTERN = "all"
-START = "2024-01-01"
-MC_COPIES = 10
-
-#######################
-#### DATA ANALYSIS ####
-#######################
-
-real = Identify(COUNTRY, PATTERN, printout=True, start_date=START)
-#real.print_data(10)
-real.initial_plot()
-real.analyse_pattern()
-mc_data = real.monte_carlo(MC_COPIES)
-
-synthetic = Identify(COUNTRY, PATTERN, start_date=START, import_df=mc_data)
-df = synthetic.analyse_pattern()
-
-##########################
-#### TRADING ANALYSIS ####
-##########################
-
-strat = Execute(COUNTRY, df)
-returns = strat.evaluate()
+# Read, plot, analyse, resample, re-analyse and evaluate as memoized stages,
+# configured from the command line or a JSON file (see python main.py --help)
+if __name__ == "__main__":
+    main()
 
 # TODO:
 # Finish candlestick patterns
@@ -42,5 +21,3 @@ returns = strat.evaluate()
 # Momentum trader
 # Hidden Markov model
 # Monte Carlo simulations
-# ML approaches
-# Options pricing opportunities
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Machine learning of next-day direction from candlestick covariates
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+from typing import Optional, Tuple
+from analysis import patterns
+from data import stack_copies
+from events import pattern_delays, pattern_bits
+
+def feature_matrix(data: pd.DataFrame,
+                   lags: Optional[int] = 3,
+                   dtype: Optional[str] = "float32",
+                   look_forward: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray, list]:
+    """
+    Build one contiguous (rows, features) matrix over all Monte Carlo copies from the covariates of analyse_pattern,
+    with the next day's direction as target and the copy of each row
+    Prices enter relative to the day's close, so that features are comparable across yield levels
+    Patterns enter on the day they become known (see events.pattern_delays), so that none uses the target day's price
+    """
+
+    close = stack_copies(data, "Price").astype(float)
+    copies, days = close.shape
+    features, names = [], []
+
+    for col in ["Open", "High", "Low"]:
+        features.append(stack_copies(data, col).astype(float) - close)
+        names.append(col)
+    for col in ["Body", "L-Wick", "U-Wick", "5 Body", "25 Body", "50 Body"]:
+        features.append(stack_copies(data, col).astype(float))
+        names.append(col)
+
+    # Lagged candles, shifted along the time axis of every copy at once
+    for lag in range(1, lags + 1):
+        for col in ["Price", "Open", "High", "Low"]:
+            values = stack_copies(data, col).astype(float)
+            lagged = np.full(values.shape, np.nan)
+            lagged[:, lag:] = values[:, :-lag]
+            features.append(lagged - close)
+            names.append(col + " " + str(lag))
+
+    # Pattern indicators from the bitmask, lagged by the delay until each pattern is known
+    bits = pattern_bits(data)
+    for code, (name, delay) in enumerate(zip(patterns, pattern_delays(look_forward))):
+        known = np.full((copies, days), np.nan)
+        known[:, delay:] = bits[:, :days - delay, code]
+        features.append(known)
+        names.append(name)
+
+    X = np.stack(features, axis=2)
+    target = np.full(close.shape, np.nan)
+    target[:, :-1] = (close[:, 1:] > close[:, :-1])
+    groups = np.repeat(np.unique(data["DF"]) if "DF" in data.columns else [0], days).reshape(copies, days)
+
+    X, target, groups = X.reshape(copies * days, -1), target.ravel(), groups.ravel()
+    valid = ~np.isnan(X).any(axis=1) & ~np.isnan(target)
+
+    return np.ascontiguousarray(X[valid], dtype=dtype), target[valid].astype(dtype), groups[valid], names
+
+class LogisticRegression:
+    """
+    OOP logistic regression class, trained with mini-batch Adam in pure NumPy
+    """
+
+    def __init__(self,
+                 learning_rate: Optional[float] = 0.01,
+                 epochs: Optional[int] = 5,
+                 batch_size: Optional[int] = 4096,
+                 l2: Optional[float] = 1e-4,
+                 seed: Optional[int] = 0) -> None:
+
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.l2 = l2
+        self.rng = np.random.default_rng(seed)
+        self.history = []
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "LogisticRegression":
+        """
+        Fit the weights on standardised features
+        """
+
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1
+        weights = np.zeros(X.shape[1] + 1, dtype=X.dtype)
+        m, v = np.zeros_like(weights), np.zeros_like(weights)
+        beta1, beta2, step = 0.9, 0.999, 0
+
+        for epoch in range(self.epochs):
+            order = self.rng.permutation(len(X))
+            loss = 0.0
+            for start in range(0, len(X), self.batch_size):
+                batch = order[start : start + self.batch_size]
+                Xb = (X[batch] - self.mean) / self.scale
+                p = 1 / (1 + np.exp(-(Xb @ weights[1:] + weights[0])))
+                error = p - y[batch]
+                gradient = np.concatenate([[error.mean()], Xb.T @ error / len(batch) + self.l2 * weights[1:]])
+
+                # Adam update
+                step += 1
+                m = beta1 * m + (1 - beta1) * gradient
+                v = beta2 * v + (1 - beta2) * gradient**2
+                weights -= self.learning_rate * (m / (1 - beta1**step)) / (np.sqrt(v / (1 - beta2**step)) + 1e-8)
+
+                p = np.clip(p, 1e-7, 1 - 1e-7)
+                loss -= float(np.sum(y[batch] * np.log(p) + (1 - y[batch]) * np.log(1 - p)))
+            self.history.append(loss / len(X))
+
+        self.weights = weights
+
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probability that the yield rises the next day
+        """
+
+        return 1 / (1 + np.exp(-(((X - self.mean) / self.scale) @ self.weights[1:] + self.weights[0])))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predicted direction, 1 for up and 0 for down
+        """
+
+        return (self.predict_proba(X) > 0.5).astype(int)
+
+    def score(self, X: np.ndarray, y: np.ndarray) -> float:
+        """
+        Accuracy of the predicted directions
+        """
+
+        return float(np.mean(self.predict(X) == y))
+
+def train_direction_model(data: pd.DataFrame,
+                          lags: Optional[int] = 3,
+                          printout: Optional[bool] = False,
+                          **kwargs) -> Tuple[LogisticRegression, pd.Series]:
+    """
+    Train a next-day direction model on the synthetic copies and test it on the real data (DF == 0)
+    """
+
+    X, y, groups, names = feature_matrix(data, lags)
+    train, test = (groups != 0), (groups == 0)
+    model = LogisticRegression(**kwargs).fit(X[train], y[train])
+
+    scores = pd.Series({"Train rows": int(train.sum()),
+                        "Train accuracy": model.score(X[train], y[train]),
+                        "Test rows": int(test.sum()),
+                        "Test accuracy": model.score(X[test], y[test]) if test.any() else np.nan,
+                        "Base rate": float(y[test].mean()) if test.any() else np.nan})
+
+    if printout:
+        print("Next-day direction model over", len(names), "features:")
+        print(scores)
+
+    return model, scores
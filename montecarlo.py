@@ -0,0 +1,244 @@
+"""
+Run the full pipeline over batches of Monte Carlo copies
+"""
+
+# Import libraries
+import time
+import numpy as np
+import pandas as pd
+
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Optional, Tuple
+from analysis import Identify
+from data import resampled_data, SEED
+from trading import Execute, traders
+
+class RunningStats:
+    """
+    Welford running mean and variance of several columns,
+    updated one batch of rows at a time
+    """
+
+    def __init__(self, columns: list) -> None:
+
+        self.columns = columns
+        self.count = 0
+        self.mean = np.zeros(len(columns))
+        self.m2 = np.zeros(len(columns))
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Merge a (rows, columns) batch into the running estimates
+        """
+
+        n = values.shape[0]
+        if n == 0:
+            return
+
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean)**2).sum(axis=0)
+        delta = batch_mean - self.mean
+        total = self.count + n
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    def std(self) -> np.ndarray:
+        """
+        Sample standard deviation
+        """
+
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.full(len(self.columns), np.nan)
+
+    def stderr(self) -> np.ndarray:
+        """
+        Standard error of the mean
+        """
+
+        return self.std() / np.sqrt(self.count) if self.count > 0 else np.full(len(self.columns), np.nan)
+
+    def summary(self, confidence: Optional[float] = 0.95) -> pd.DataFrame:
+        """
+        Table of the running estimates with a normal confidence interval on the mean
+        """
+
+        z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+
+        return pd.DataFrame({"Mean": self.mean,
+                             "Std": self.std(),
+                             "Std Err": self.stderr(),
+                             "Lower": self.mean - z * self.stderr(),
+                             "Upper": self.mean + z * self.stderr(),
+                             "Copies": self.count}, index=self.columns)
+
+def run_batch(country: str,
+              pattern: str,
+              start_date: str,
+              end_date: str,
+              copy_ids: list,
+              seed: Optional[int] = SEED,
+              include_real: Optional[bool] = False,
+              cost: Optional[float] = 0.0,
+              size: Optional[float] = 1.0,
+              dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Generate a batch of copies, find their patterns and trade them,
+    returning only the per-copy results table
+    """
+
+    data = resampled_data(country, 0, start_date, end_date, seed, copy_ids=copy_ids, include_real=include_real, dtype=dtype)
+    synthetic = Identify(country, pattern, start_date=start_date, end_date=end_date, import_df=data, dtype=dtype)
+    df = synthetic.analyse_pattern()
+
+    return Execute(country, df, cost, size, dtype=dtype).evaluate(printout=False)
+
+def adaptive_monte_carlo(country: str,
+                         pattern: Optional[str] = "all",
+                         start_date: Optional[str] = "2000-01-01",
+                         end_date: Optional[str] = "2025-01-01",
+                         batch_size: Optional[int] = 10,
+                         tolerance: Optional[float] = 0.1,
+                         max_copies: Optional[int] = 1000,
+                         confidence: Optional[float] = 0.95,
+                         metric: Optional[str] = "Return",
+                         seed: Optional[int] = SEED,
+                         dtype: Optional[str] = None,
+                         printout: Optional[bool] = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generate and evaluate copies in batches until the confidence interval on every trader's mean
+    is narrower than 'tolerance', or 'max_copies' copies have been used
+    Returns the summary per trader and the per-copy results table
+    """
+
+    stats = RunningStats(traders)
+    results = []
+
+    while stats.count < max_copies:
+        copy_ids = list(range(stats.count + 1, min(stats.count + batch_size, max_copies) + 1))
+        batch = run_batch(country, pattern, start_date, end_date, copy_ids, seed, include_real=(stats.count == 0), dtype=dtype)
+        results.append(batch)
+        synthetic = batch[batch.index != 0]
+        stats.update(synthetic.xs(metric, axis=1, level=1)[traders].to_numpy())
+
+        summary = stats.summary(confidence)
+        width = summary["Upper"] - summary["Lower"]
+        if printout:
+            print("After {} copies the widest {:.0f}% interval is {:.4f}".format(stats.count, 100 * confidence, width.max()))
+        if stats.count > 1 and (width < tolerance).all():
+            break
+
+    results = pd.concat(results)
+    summary = stats.summary(confidence)
+    if 0 in results.index:
+        summary["Real"] = results.loc[0].xs(metric, level=1)[traders].to_numpy()
+
+    if printout:
+        converged = "converged" if (summary["Upper"] - summary["Lower"] < tolerance).all() else "reached the copy budget"
+        print("Adaptive Monte Carlo", converged, "after", stats.count, "copies:")
+        print(summary)
+
+    return summary, results
+
+def chunked_monte_carlo(country: str,
+                        copies: int,
+                        pattern: Optional[str] = "all",
+                        start_date: Optional[str] = "2000-01-01",
+                        end_date: Optional[str] = "2025-01-01",
+                        chunk_size: Optional[int] = 100,
+                        scheduler: Optional[str] = None,
+                        workers: Optional[int] = None,
+                        seed: Optional[int] = SEED,
+                        cost: Optional[float] = 0.0,
+                        size: Optional[float] = 1.0,
+                        metric: Optional[str] = "Return",
+                        dtype: Optional[str] = None,
+                        printout: Optional[bool] = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Run the whole pipeline over 'copies' copies in chunks of 'chunk_size' copies,
+    keeping only the per-copy results so that peak memory depends on the chunk size, not the number of copies
+    Chunks run one after another, or on a local process pool (scheduler="processes") or Dask (scheduler="dask")
+    Returns the summary per trader and the per-copy results table
+    """
+
+    chunks = [list(range(start, min(start + chunk_size, copies + 1))) for start in range(1, copies + 1, chunk_size)]
+    include_real = [i == 0 for i in range(len(chunks))]
+    arguments = [repeat(country), repeat(pattern), repeat(start_date), repeat(end_date),
+                 chunks, repeat(seed), include_real, repeat(cost), repeat(size), repeat(dtype)]
+
+    if scheduler is None:
+        results = map(run_batch, *arguments)
+    elif scheduler == "processes":
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(run_batch, *arguments)
+    elif scheduler == "dask":
+        import dask
+        tasks = [dask.delayed(run_batch)(*args) for args in zip(*arguments)]
+        results = dask.compute(*tasks, scheduler="processes", num_workers=workers)
+    else:
+        raise Exception("Error: Scheduler not recognised")
+
+    stats = RunningStats(traders)
+    tables = []
+    for batch in results:
+        tables.append(batch)
+        stats.update(batch[batch.index != 0].xs(metric, axis=1, level=1)[traders].to_numpy())
+        if printout:
+            print("Finished {} of {} copies".format(stats.count, copies))
+    if scheduler == "processes":
+        pool.shutdown()
+
+    results = pd.concat(tables)
+    summary = stats.summary()
+    if 0 in results.index:
+        summary["Real"] = results.loc[0].xs(metric, level=1)[traders].to_numpy()
+
+    if printout:
+        print(summary)
+
+    return summary, results
+
+def precision_report(country: str,
+                     copies: Optional[int] = 20,
+                     pattern: Optional[str] = "all",
+                     start_date: Optional[str] = "2000-01-01",
+                     end_date: Optional[str] = "2025-01-01",
+                     dtype: Optional[str] = "float32",
+                     seed: Optional[int] = SEED,
+                     printout: Optional[bool] = True) -> pd.Series:
+    """
+    Run the same copies at full and reduced precision, and report how many pattern hits flip
+    at threshold edges, how far the returns move, and the memory and time saved
+    """
+
+    runs = {}
+    for precision in [None, dtype]:
+        start = time.perf_counter()
+        data = resampled_data(country, copies, start_date, end_date, seed, dtype=precision)
+        synthetic = Identify(country, pattern, start_date=start_date, end_date=end_date, import_df=data, dtype=precision, cache=None)
+        df = synthetic.analyse_pattern()
+        results = Execute(country, df, dtype=precision).evaluate(printout=False)
+        runs[precision] = (df, results, time.perf_counter() - start,
+                           df.memory_usage(deep=True).sum(), df.select_dtypes("float").memory_usage().sum())
+
+    full, full_results, full_time, full_memory, full_floats = runs[None]
+    reduced, reduced_results, reduced_time, reduced_memory, reduced_floats = runs[dtype]
+    hits = (full["Pattern"] != "").sum()
+    flips = (full["Pattern"].to_numpy() != reduced["Pattern"].to_numpy()).sum()
+    returns = full_results.xs("Return", axis=1, level=1) - reduced_results.xs("Return", axis=1, level=1)
+
+    report = pd.Series({"Pattern hits": hits,
+                        "Flipped hits": flips,
+                        "Flipped fraction": flips / max(hits, 1),
+                        "Max return difference": abs(returns).max().max(),
+                        "Mean return difference": abs(returns).mean().mean(),
+                        "Memory ratio": reduced_memory / full_memory,
+                        "Float memory ratio": reduced_floats / full_floats,
+                        "Speed up": full_time / reduced_time})
+
+    if printout:
+        print("Comparing float64 with", dtype, "over", copies, "copies:")
+        print(report)
+
+    return report
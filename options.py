@@ -0,0 +1,184 @@
+"""
+Price bond yield options on Monte Carlo yield paths
+"""
+
+# Import libraries
+import math
+import numpy as np
+import pandas as pd
+
+from typing import Optional, Tuple
+from data import stack_copies
+
+def erf(x: np.ndarray) -> np.ndarray:
+    """
+    Error function, vectorised with the Abramowitz and Stegun 7.1.26 approximation (absolute error below 1.5e-7)
+    """
+
+    x = np.asarray(x, dtype=float)
+    t = 1 / (1 + 0.3275911 * np.abs(x))
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+
+    return np.sign(x) * (1 - poly * np.exp(-x**2))
+
+def normal_cdf(x: np.ndarray) -> np.ndarray:
+    """
+    Standard normal cumulative distribution function
+    """
+
+    return 0.5 * (1 + erf(np.asarray(x) / math.sqrt(2)))
+
+def normal_pdf(x: np.ndarray) -> np.ndarray:
+    """
+    Standard normal probability density function
+    """
+
+    return np.exp(-0.5 * np.asarray(x)**2) / math.sqrt(2 * math.pi)
+
+def yield_paths(data: pd.DataFrame,
+                synthetic_only: Optional[bool] = True,
+                spot: Optional[float] = None) -> np.ndarray:
+    """
+    Yield paths as a (copies, days) array from the stacked Monte Carlo dataframe,
+    by default leaving out the real data
+    Resampled copies start from different yields, so every path is rebased to a common spot,
+    by default today's yield of the real data (DF == 0)
+    """
+
+    paths = stack_copies(data, "Price").astype(float)
+    ids = np.unique(data["DF"]) if "DF" in data.columns else np.zeros(1)
+    if spot is None:
+        spot = paths[ids == 0, 0].mean() if (ids == 0).any() else paths[:, 0].mean()
+    if synthetic_only and "DF" in data.columns:
+        paths = paths[ids != 0]
+
+    return rebase(paths, spot)
+
+def rebase(paths: np.ndarray, spot: float) -> np.ndarray:
+    """
+    Scale every path so that it starts at the spot yield
+    """
+
+    return paths * spot / paths[:, :1]
+
+def path_payoffs(paths: np.ndarray,
+                 strikes: np.ndarray,
+                 expiries: np.ndarray,
+                 kind: Optional[str] = "call",
+                 style: Optional[str] = "european") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Payoffs of every path for a grid of expiries (in trading days) and strikes,
+    as (copies, expiries, strikes) arrays, with the payoff's derivative with respect to the underlying
+    and the underlying itself
+    """
+
+    if expiries.min() < 1 or expiries.max() >= paths.shape[1]:
+        raise Exception("Error: Expiries must be between 1 and {} trading days".format(paths.shape[1] - 1))
+
+    if style == "european":
+        underlying = paths[:, expiries]
+    elif style == "asian":
+        # Arithmetic average of the fixings after today up to expiry
+        running = np.cumsum(paths[:, 1:], axis=1) / np.arange(1, paths.shape[1])
+        underlying = running[:, expiries - 1]
+    else:
+        raise Exception("Error: Option style not recognised")
+
+    moneyness = underlying[:, :, None] - strikes[None, None, :]
+    if kind == "call":
+        payoff, slope = np.maximum(moneyness, 0), (moneyness > 0).astype(float)
+    elif kind == "put":
+        payoff, slope = np.maximum(-moneyness, 0), -(moneyness < 0).astype(float)
+    else:
+        raise Exception("Error: Option kind not recognised")
+
+    return payoff, slope, underlying
+
+def monte_carlo_price(paths: np.ndarray,
+                      strikes: np.ndarray,
+                      expiries: np.ndarray,
+                      kind: Optional[str] = "call",
+                      style: Optional[str] = "european",
+                      rate: Optional[float] = 0.0,
+                      periods: Optional[int] = 252,
+                      spot: Optional[float] = None) -> pd.DataFrame:
+    """
+    Price a grid of yield options in one broadcast computation over all paths,
+    rebased to a common spot yield, by default their average starting yield, with pathwise Greeks:
+    Delta differentiates through the starting yield, as the paths scale with it,
+    Vega differentiates through a scaling of each path's move away from its starting yield,
+    expressed per unit of the paths' annualised normal volatility
+    """
+
+    strikes, expiries = np.asarray(strikes, dtype=float), np.asarray(expiries, dtype=int)
+    paths = rebase(paths, paths[:, 0].mean() if spot is None else spot)
+    payoff, slope, underlying = path_payoffs(paths, strikes, expiries, kind, style)
+    discount = np.exp(-rate * expiries / periods)[:, None]
+    start = paths[:, :1, None]
+    sigma = np.diff(paths, axis=1).std() * math.sqrt(periods)
+
+    result = pd.DataFrame({"Price": (discount * payoff.mean(axis=0)).ravel(),
+                           "Std Err": (discount * payoff.std(axis=0) / math.sqrt(paths.shape[0])).ravel(),
+                           "Delta": (discount * (slope * underlying[:, :, None] / start).mean(axis=0)).ravel(),
+                           "Vega": (discount * (slope * (underlying[:, :, None] - start)).mean(axis=0) / sigma).ravel()},
+                          index=pd.MultiIndex.from_product([expiries, strikes], names=["Expiry", "Strike"]))
+
+    return result
+
+def bachelier_price(forward: float,
+                    strikes: np.ndarray,
+                    expiries: np.ndarray,
+                    sigma: float,
+                    kind: Optional[str] = "call",
+                    rate: Optional[float] = 0.0,
+                    periods: Optional[int] = 252) -> pd.DataFrame:
+    """
+    Closed-form Bachelier (normal model) prices and Greeks for a grid of expiries (in trading days) and strikes,
+    where 'sigma' is the annualised normal volatility of the yield
+    """
+
+    strikes, expiries = np.asarray(strikes, dtype=float), np.asarray(expiries, dtype=int)
+    time = (expiries / periods)[:, None]
+    discount = np.exp(-rate * time)
+    spread = sigma * np.sqrt(time)
+    d = (forward - strikes[None, :]) / spread
+
+    if kind == "call":
+        price = discount * ((forward - strikes) * normal_cdf(d) + spread * normal_pdf(d))
+        delta = discount * normal_cdf(d)
+    elif kind == "put":
+        price = discount * ((strikes - forward) * normal_cdf(-d) + spread * normal_pdf(d))
+        delta = -discount * normal_cdf(-d)
+    else:
+        raise Exception("Error: Option kind not recognised")
+    vega = discount * np.sqrt(time) * normal_pdf(d)
+
+    return pd.DataFrame({"Price": price.ravel(), "Delta": delta.ravel(), "Vega": vega.ravel()},
+                        index=pd.MultiIndex.from_product([expiries, strikes], names=["Expiry", "Strike"]))
+
+def price_options(data: pd.DataFrame,
+                  strikes: list,
+                  expiries: list,
+                  kind: Optional[str] = "call",
+                  rate: Optional[float] = 0.0,
+                  periods: Optional[int] = 252,
+                  printout: Optional[bool] = False,
+                  spot: Optional[float] = None) -> pd.DataFrame:
+    """
+    Price European and Asian yield options on the Monte Carlo paths rebased to a spot yield,
+    by default today's yield of the real data, next to the Bachelier benchmark with the same spot and normal volatility
+    """
+
+    paths = yield_paths(data, spot=spot)
+    spot = paths[0, 0]
+    sigma = np.diff(paths, axis=1).std() * math.sqrt(periods)
+
+    result = pd.concat({"European": monte_carlo_price(paths, strikes, expiries, kind, "european", rate, periods, spot),
+                        "Asian": monte_carlo_price(paths, strikes, expiries, kind, "asian", rate, periods, spot),
+                        "Bachelier": bachelier_price(spot, strikes, expiries, sigma, kind, rate, periods)}, axis=1)
+
+    if printout:
+        print("Pricing {} options on {} paths from a {:.4f} spot with {:.4f} normal volatility:".format(kind, paths.shape[0], spot, sigma))
+        print(result)
+
+    return result
@@ -0,0 +1,370 @@
+"""
+Run the analysis as a pipeline of stages, memoizing the output of every stage on disk
+"""
+
+# Import libraries
+import io
+import os
+import sys
+import json
+import pickle
+import hashlib
+import argparse
+import threading
+import contextlib
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Callable
+from analysis import Identify
+from data import resampled_data, SEED
+from trading import Execute, traders
+from events import event_study
+from significance import trader_significance, permutation_test
+from bootstrap import bootstrap_summary
+from plotting import summary_plot, candlestick_plot, scatter_matrix_plot
+from plotting import multiple_candlestick, monte_carlo_paths
+
+# Defaults of every parameter, overridden by the config file and then by the command line
+defaults = {"country": "US",
+            "pattern": "all",
+            "start_date": "2024-01-01",
+            "end_date": "2025-01-01",
+            "copies": 10,
+            "seed": SEED,
+            "method": "block",
+            "cost": 0.0,
+            "size": 1.0,
+            "stop_loss": 0.10,
+            "take_profit": 0.20,
+            "traders": traders,
+            "horizons": 10,
+            "permutations": 5000,
+            "draws": 10000,
+            "plot": True,
+            "cache_dir": ".pipeline"}
+
+class Stage:
+    """
+    One step of the pipeline, with the stages whose outputs it takes as inputs
+    and the parameters its output depends on
+    Plot stages have no output, are never memoized and always run on the main thread
+    """
+
+    def __init__(self,
+                 name: str,
+                 function: Callable,
+                 inputs: Optional[list] = [],
+                 parameters: Optional[list] = [],
+                 plot: Optional[bool] = False) -> None:
+
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.parameters = parameters
+        self.plot = plot
+
+class ThreadOutput(io.TextIOBase):
+    """
+    Standard output that sends the writes of a thread to its own buffer while it has one,
+    and everything else to the wrapped stream
+    """
+
+    def __init__(self, stream) -> None:
+
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+def source_file(country: str) -> str:
+    """
+    Hash of the contents of a country's data file, so that stages reading it rerun when it changes
+    """
+
+    h = hashlib.sha256()
+    with open(country + "-bond-yield.csv", "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+def analyse_real(config: dict) -> pd.DataFrame:
+    """
+    Find the patterns in the real data
+    """
+
+    real = Identify(config["country"], config["pattern"], printout=True,
+                    start_date=config["start_date"], end_date=config["end_date"])
+    return real.analyse_pattern()
+
+def plot_real(config: dict, real: pd.DataFrame) -> None:
+    """
+    Initial plots of the real data
+    """
+
+    print("Printing summary plot")
+    summary_plot(config["country"], real)
+    print("Printing candelstick plot")
+    candlestick_plot(config["country"], real)
+    print("Printing scatter matrix plot")
+    scatter_matrix_plot(real, binned=True)
+
+def monte_carlo(config: dict) -> pd.DataFrame:
+    """
+    Resample the real data into Monte Carlo copies
+    """
+
+    return resampled_data(config["country"], config["copies"], config["start_date"], config["end_date"], config["seed"],
+                          method=config["method"])
+
+def plot_monte_carlo(config: dict, mc_data: pd.DataFrame) -> None:
+    """
+    Plot the Monte Carlo copies against the real data
+    """
+
+    multiple_candlestick(config["country"], mc_data, config["start_date"])
+    monte_carlo_paths(config["country"], mc_data, config["start_date"])
+
+def analyse_synthetic(config: dict, mc_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Find the patterns in every Monte Carlo copy
+    """
+
+    synthetic = Identify(config["country"], config["pattern"], start_date=config["start_date"],
+                         end_date=config["end_date"], import_df=mc_data)
+    return synthetic.analyse_pattern()
+
+def study_events(config: dict, synthetic: pd.DataFrame) -> pd.DataFrame:
+    """
+    Forward returns after every pattern
+    """
+
+    return event_study(synthetic, config["horizons"], printout=True)
+
+def execute(config: dict, synthetic: pd.DataFrame) -> pd.DataFrame:
+    """
+    Evaluate the trading strategies on every copy
+    """
+
+    # Execute adds an "Action" column, so keep the shared input untouched
+    strat = Execute(config["country"], synthetic.copy(), config["cost"], config["size"],
+                    stop_loss=config["stop_loss"], take_profit=config["take_profit"])
+    return strat.evaluate(selected=config["traders"])
+
+def significance(config: dict, returns: pd.DataFrame, synthetic: pd.DataFrame) -> dict:
+    """
+    P-values of the traders and patterns against the synthetic copies
+    """
+
+    return {"traders": trader_significance(returns, printout=True),
+            "patterns": permutation_test(synthetic, permutations=config["permutations"], seed=config["seed"], printout=True)}
+
+def bootstrap(config: dict, returns: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bootstrap confidence intervals on the traders' returns and their differences to holding
+    """
+
+    return bootstrap_summary(returns, draws=config["draws"], seed=config["seed"], printout=True)
+
+stages = [Stage("real", analyse_real, [], ["country", "source", "pattern", "start_date", "end_date"]),
+          Stage("real_plot", plot_real, ["real"], ["country"], plot=True),
+          Stage("monte_carlo", monte_carlo, [], ["country", "source", "copies", "start_date", "end_date", "seed", "method"]),
+          Stage("monte_carlo_plot", plot_monte_carlo, ["monte_carlo"], ["country", "start_date"], plot=True),
+          Stage("synthetic", analyse_synthetic, ["monte_carlo"], ["country", "pattern", "start_date", "end_date"]),
+          Stage("events", study_events, ["synthetic"], ["horizons"]),
+          Stage("execute", execute, ["synthetic"], ["country", "cost", "size", "stop_loss", "take_profit", "traders"]),
+          Stage("significance", significance, ["execute", "synthetic"], ["permutations", "seed"]),
+          Stage("bootstrap", bootstrap, ["execute"], ["draws", "seed"])]
+
+class Pipeline:
+    """
+    OOP pipeline class
+    """
+
+    def __init__(self,
+                 config: Optional[dict] = None,
+                 stages: Optional[list] = stages,
+                 force: Optional[bool] = False) -> None:
+
+        self.config = {**defaults, **(config or {})}
+        self.config["source"] = source_file(self.config["country"])
+        self.stages = {stage.name: stage for stage in stages}
+        self.force = force
+        self.outputs = {}
+        self.keys = {}
+        os.makedirs(self.config["cache_dir"], exist_ok=True)
+
+        # A stage's key hashes its parameters and the keys of its inputs, so it changes with anything upstream
+        for stage in stages:
+            description = {"stage": stage.name,
+                           "parameters": {p: self.config[p] for p in stage.parameters},
+                           "inputs": {name: self.keys[name] for name in stage.inputs}}
+            self.keys[stage.name] = hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def filename(self, name: str) -> str:
+        """
+        File holding the memoized output of a stage
+        """
+
+        return os.path.join(self.config["cache_dir"], name + "-" + self.keys[name][:16] + ".pkl")
+
+    def output(self, name: str) -> object:
+        """
+        Output of a stage, loaded from disk the first time it is needed
+        """
+
+        if name not in self.outputs:
+            with open(self.filename(name), "rb") as f:
+                self.outputs[name] = pickle.load(f)
+
+        return self.outputs[name]
+
+    def needed(self, targets: list) -> list:
+        """
+        Stages to run to get the targets, skipping every stage already memoized on disk
+        and every stage upstream of those alone
+        """
+
+        needed, pending = [], list(targets)
+        while pending:
+            name = pending.pop()
+            stage = self.stages[name]
+            if name in needed:
+                continue
+            if stage.plot and not self.config["plot"]:
+                continue
+            if stage.plot or self.force or not os.path.exists(self.filename(name)):
+                needed.append(name)
+                pending.extend(stage.inputs)
+
+        return [name for name in self.stages if name in needed]
+
+    def run_stage(self, name: str) -> object:
+        """
+        Run one stage on the outputs of its inputs, saving its output to disk
+        """
+
+        stage = self.stages[name]
+        result = stage.function(self.config, *[self.output(i) for i in stage.inputs])
+        if not stage.plot:
+            with open(self.filename(name), "wb") as f:
+                pickle.dump(result, f)
+            self.outputs[name] = result
+
+        return result
+
+    def captured_stage(self, name: str, output: ThreadOutput) -> str:
+        """
+        Run one stage in a thread of the pool, returning its printout instead of printing it
+        """
+
+        buffer = output.local.buffer = io.StringIO()
+        try:
+            self.run_stage(name)
+        except Exception:
+            # The printout leading up to an error is still shown
+            output.stream.write(buffer.getvalue())
+            raise
+        finally:
+            output.local.buffer = None
+
+        return buffer.getvalue()
+
+    def run(self,
+            targets: Optional[list] = None,
+            workers: Optional[int] = None) -> dict:
+        """
+        Run every needed stage once its inputs are ready,
+        with independent stages in a pool of threads and plot stages on the main thread
+        The printout of a stage in the pool is held back until it finishes, so that stages running at the same time
+        do not interleave their printouts
+        """
+
+        targets = list(self.stages) if targets is None else targets
+        remaining = self.needed(targets)
+        cached = [name for name in self.stages if name not in remaining and not self.stages[name].plot and name in targets + sum([self.stages[t].inputs for t in remaining], [])]
+        if cached:
+            print("Loading memoized stages:", ", ".join(cached))
+
+        done = set(self.stages) - set(remaining)
+        running = {}
+        output = ThreadOutput(sys.stdout)
+        with contextlib.redirect_stdout(output), ThreadPoolExecutor(max_workers=workers) as pool:
+            while remaining or running:
+                ready = [name for name in remaining if all(i in done for i in self.stages[name].inputs)]
+                for name in ready:
+                    remaining.remove(name)
+                    if self.stages[name].plot:
+                        self.run_stage(name)
+                        done.add(name)
+                    else:
+                        print("Running stage", name)
+                        running[pool.submit(self.captured_stage, name, output)] = name
+                if any(self.stages[name].plot for name in ready):
+                    continue
+                if running:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        print(future.result(), end="")
+                        done.add(running.pop(future))
+                elif remaining:
+                    raise Exception("Error: Stages {} have unmet inputs".format(remaining))
+
+        return {name: self.output(name) for name in targets if not self.stages[name].plot}
+
+def parse_arguments(argv: Optional[list] = None) -> tuple:
+    """
+    Read the config file and command line options into a config dictionary
+    """
+
+    parser = argparse.ArgumentParser(description="Analyse candlestick patterns in bond yields and evaluate trading strategies")
+    parser.add_argument("--config", help="JSON file of parameters")
+    parser.add_argument("--country")
+    parser.add_argument("--pattern")
+    parser.add_argument("--start-date", dest="start_date")
+    parser.add_argument("--end-date", dest="end_date")
+    parser.add_argument("--copies", type=int, help="Number of Monte Carlo copies")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--method", choices=["block", "regime"], help="Monte Carlo resampling method")
+    parser.add_argument("--cost", type=float)
+    parser.add_argument("--size", type=float)
+    parser.add_argument("--stop-loss", dest="stop_loss", type=float)
+    parser.add_argument("--take-profit", dest="take_profit", type=float)
+    parser.add_argument("--traders", nargs="+", choices=traders)
+    parser.add_argument("--horizons", type=int)
+    parser.add_argument("--permutations", type=int)
+    parser.add_argument("--draws", type=int, help="Number of bootstrap draws")
+    parser.add_argument("--no-plot", dest="plot", action="store_const", const=False)
+    parser.add_argument("--cache-dir", dest="cache_dir")
+    parser.add_argument("--stages", nargs="+", help="Stages to produce, by default all of them")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--force", action="store_true", help="Ignore memoized outputs")
+    args = vars(parser.parse_args(argv))
+
+    config = {}
+    if args["config"] is not None:
+        with open(args["config"]) as f:
+            config.update(json.load(f))
+    config.update({key: value for key, value in args.items() if key in defaults and value is not None})
+
+    return config, args
+
+def main(argv: Optional[list] = None) -> dict:
+    """
+    Command line entry point
+    """
+
+    config, args = parse_arguments(argv)
+    pipeline = Pipeline(config, force=args["force"])
+
+    return pipeline.run(args["stages"], args["workers"])
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,13 @@ Make plots of financial data
 """
 
 # Import libraries
+import numpy as np
 import pandas as pd
 import mplfinance as mpf
 import matplotlib.pyplot as plt
 
-from typing import Optional
-from data import check_date, filter_data
+from typing import Optional, Tuple, Union, Iterable
+from data import check_date, filter_data, SEED
 
 def summary_plot(country: str,
                  data: pd.DataFrame,
@@ -126,10 +127,110 @@ def monte_carlo_paths(country: str,
     plt.legend()
     plt.show()
 
-def scatter_matrix_plot(data: pd.DataFrame) -> None:
+def numeric_columns(data: pd.DataFrame) -> list:
+    """
+    Columns worth plotting against each other, leaving out text (Pattern, Trend),
+    booleans (Min, Max) and identifiers (DF, Mask)
+    """
+
+    numeric = data.select_dtypes(include="number").columns
+
+    return [col for col in numeric if col not in ["DF", "Mask"]]
+
+def reservoir_sample(data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                     size: int,
+                     seed: Optional[int] = SEED) -> pd.DataFrame:
+    """
+    Uniform random sample of 'size' rows from a dataframe or a stream of chunks (e.g. from read_chunks),
+    keeping a reservoir that each new chunk updates in one vectorised step
+    """
+
+    rng = np.random.default_rng(seed)
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    reservoir, seen = None, 0
+
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        # Fill the reservoir with the first rows
+        fill = size if reservoir is None else size - len(reservoir)
+        head, chunk = chunk.iloc[:fill], chunk.iloc[fill:]
+        reservoir = head.copy() if reservoir is None else pd.concat([reservoir, head], ignore_index=True)
+        seen += len(head)
+        if chunk.empty:
+            continue
+
+        # Row number i replaces a random slot with probability size / (i + 1), later rows winning ties
+        slots = rng.integers(0, seen + np.arange(1, len(chunk) + 1))
+        keep = slots < size
+        for col in reservoir.columns:
+            values = reservoir[col].to_numpy().copy()
+            values[slots[keep]] = chunk[col].to_numpy()[keep]
+            reservoir[col] = values
+        seen += len(chunk)
+
+    return reservoir
+
+def binned_histograms(data: pd.DataFrame,
+                      columns: Optional[list] = None,
+                      bins: Optional[int] = 50) -> Tuple[dict, dict, dict]:
+    """
+    Marginal histograms of every column and 2-D histograms of every pair of columns,
+    with one NumPy binning pass per pair over shared bin edges
+    Returns the edges and marginal counts keyed by column, and the joint counts keyed by pair
+    """
+
+    columns = numeric_columns(data) if columns is None else columns
+    values = {col: data[col].to_numpy(dtype=float) for col in columns}
+
+    edges, marginals, joints = {}, {}, {}
+    for col in columns:
+        finite = values[col][np.isfinite(values[col])]
+        low, high = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+        edges[col] = np.linspace(low, high if high > low else low + 1.0, bins + 1)
+        marginals[col], _ = np.histogram(finite, edges[col])
+
+    for i, x in enumerate(columns):
+        for y in columns[i + 1:]:
+            finite = np.isfinite(values[x]) & np.isfinite(values[y])
+            joints[(x, y)], _, _ = np.histogram2d(values[x][finite], values[y][finite], [edges[x], edges[y]])
+
+    return edges, marginals, joints
+
+def scatter_matrix_plot(data: pd.DataFrame,
+                        binned: Optional[bool] = False,
+                        bins: Optional[int] = 50,
+                        sample: Optional[int] = None) -> None:
     """
     Plot a scatter matrix to show correlations between variables
+    With 'binned', the numeric columns are drawn as 2-D histograms with marginal histograms on the diagonal,
+    which stays fast and readable on the stacked Monte Carlo frame, optionally on a random sample of rows
     """
 
-    pd.plotting.scatter_matrix(data, figsize=(8, 8), marker = '0', hist_kwds = {'bins': 10}, s = 30, alpha = 0.8)
-    plt.show()
\ No newline at end of file
+    if not binned:
+        pd.plotting.scatter_matrix(data, figsize=(8, 8), marker = '0', hist_kwds = {'bins': 10}, s = 30, alpha = 0.8)
+        plt.show()
+        return
+
+    if sample is not None and sample < len(data):
+        data = reservoir_sample(data, sample)
+    columns = numeric_columns(data)
+    edges, marginals, joints = binned_histograms(data, columns, bins)
+
+    n = len(columns)
+    fig, axes = plt.subplots(n, n, figsize=(8, 8), squeeze=False)
+    for i, y in enumerate(columns):
+        for j, x in enumerate(columns):
+            ax = axes[i, j]
+            if i == j:
+                ax.stairs(marginals[x], edges[x], fill=True)
+            else:
+                counts = joints[(x, y)] if (x, y) in joints else joints[(y, x)].T
+                ax.pcolormesh(edges[x], edges[y], np.log1p(counts.T), cmap="Blues")
+            ax.set_xticks([])
+            ax.set_yticks([])
+            if i == n - 1:
+                ax.set_xlabel(x, rotation=90)
+            if j == 0:
+                ax.set_ylabel(y, rotation=0, ha="right")
+
+    plt.show()
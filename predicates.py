@@ -0,0 +1,236 @@
+"""
+Conditions of every candlestick pattern, shared by Identify and the cross-sectional Panel
+"""
+
+# Import libraries
+import numpy as np
+
+# Covariates the pattern conditions are evaluated on, named as the columns of Identify
+columns = ["Open", "High", "Low", "Price", "Body", "L-Wick", "U-Wick", "5 Body", "25 Body", "50 Body", "Min", "Max"]
+
+def lag(values: np.ndarray, days: int) -> np.ndarray:
+    """
+    Shift an array 'days' steps forward along its last (time) axis, padding with NaN,
+    so that a series shorter than 'days' is all NaN
+    """
+
+    if days == 0:
+        return values
+
+    n = values.shape[-1]
+    days = min(days, n)
+    dtype = values.dtype if values.dtype.kind == "f" else float
+    pad = np.full(values.shape[:-1] + (days,), np.nan, dtype=dtype)
+
+    return np.concatenate([pad, values[..., :n - days]], axis=-1)
+
+def hammer(x: dict) -> np.ndarray:
+    # Lower wick >= 150% of body
+    mask_long_wick = (1.5*x["Body"] <= x["L-Wick"])
+    # Body within the 25th percentile
+    mask_short_body = (x["Body"] <= x["25 Body"])
+    # Local minimum
+    mask_minimum = (x["Min"] == True)
+
+    return mask_long_wick & mask_short_body & mask_minimum
+
+def inv_hammer(x: dict) -> np.ndarray:
+    # Lower wick <= 25% of body
+    mask_short_wick = (0.25*x["Body"] >= x["L-Wick"])
+    # Upper wick >= 150% of body
+    mask_long_wick = (1.5*x["Body"] <= x["U-Wick"])
+    # Local minimum
+    mask_minimum = (x["Min"] == True)
+
+    return mask_short_wick & mask_long_wick & mask_minimum
+
+def bull_engulf(x: dict) -> np.ndarray:
+    # Second candle has a green body
+    mask_second_green = (x["Price"] > x["Open"])
+    # First candle has a red body
+    mask_first_red = (lag(x["Open"], 1) > lag(x["Price"], 1))
+    # First candle has a short body (body within the 50th percentile)
+    mask_first_short = (lag(x["Body"], 1) <= x["50 Body"])
+    # First candle is engulfed by the second candle
+    mask_engulf = (x["Open"] < lag(x["Price"], 1)) & (x["Price"] > lag(x["Open"], 1))
+
+    return mask_second_green & mask_first_red & mask_first_short & mask_engulf
+
+def piercing(x: dict) -> np.ndarray:
+    # Second candle has a green body
+    mask_second_green = (x["Price"] > x["Open"])
+    # First candle has a red body
+    mask_first_red = (lag(x["Open"], 1) > lag(x["Price"], 1))
+    # Both candles have long bodies (body greater than the 50th percentile)
+    mask_first_long = (lag(x["Body"], 1) >= x["50 Body"])
+    mask_second_long = (x["Body"] >= x["50 Body"])
+    # Significant gap down between first candle price and second candle opening
+    mask_gap_down = (lag(x["Price"], 1) - x["Open"] >= x["25 Body"])
+    # Price on second bar must be must be more than halfway up the body of the first bar
+    mask_body = (x["Price"] >= lag(x["Price"], 1) + lag(x["Body"], 1)/2)
+
+    return mask_first_red & mask_second_green & mask_first_long & mask_second_long & mask_gap_down & mask_body
+
+def morning(x: dict) -> np.ndarray:
+    # Third candle has a green body
+    mask_third_green = (x["Price"] > x["Open"])
+    # First candle has a red body
+    mask_first_red = (lag(x["Open"], 2) > lag(x["Price"], 2))
+    # First and third candles have long bodies (body greater than the 50th percentile)
+    mask_first_long = (lag(x["Body"], 2) >= x["50 Body"])
+    mask_third_long = (x["Body"] >= x["50 Body"])
+    # Second candle has a short body (less than the 25th percentile)
+    mask_second_short = (lag(x["Body"], 1) <= x["25 Body"])
+
+    return mask_third_green & mask_first_red & mask_first_long & mask_third_long & mask_second_short
+
+def soldiers(x: dict) -> np.ndarray:
+    o, c, b, lw, uw = x["Open"], x["Price"], x["Body"], x["L-Wick"], x["U-Wick"]
+    # All three bodies are green
+    mask_green = (c > o) & (lag(c, 1) > lag(o, 1)) & (lag(c, 2) > lag(o, 2))
+    # All three candles have small wicks (less than 25% of the body)
+    mask_upper_wicks = (0.25*b >= uw) & (0.25*lag(b, 1) >= lag(uw, 1)) & (0.25*lag(b, 2) >= lag(uw, 2))
+    mask_lower_wicks = (0.25*b >= lw) & (0.25*lag(b, 1) >= lag(lw, 1)) & (0.25*lag(b, 2) >= lag(lw, 2))
+    # Successive candles open and close progressively higher
+    mask_close = (c > lag(c, 1)) & (lag(c, 1) > lag(c, 2))
+    mask_open = (o > lag(o, 1)) & (lag(o, 1) > lag(o, 2))
+
+    return mask_green & mask_lower_wicks & mask_upper_wicks & mask_close & mask_open
+
+def hanging(x: dict) -> np.ndarray:
+    # Lower wick >= 150% of body
+    mask_long_wick = (1.5*x["Body"] <= x["L-Wick"])
+    # Body within the 25th percentile
+    mask_short_body = (x["Body"] <= x["25 Body"])
+    # Local maximum
+    mask_maximum = (x["Max"] == True)
+
+    return mask_long_wick & mask_short_body & mask_maximum
+
+def shooting(x: dict) -> np.ndarray:
+    # Lower wick <= 25% of body
+    mask_short_wick = (0.25*x["Body"] >= x["L-Wick"])
+    # Upper wick >= 150% of body
+    mask_long_wick = (1.5*x["Body"] <= x["U-Wick"])
+    # Local maximum
+    mask_maximum = (x["Max"] == True)
+    # Candle has a red body
+    mask_red = (x["Open"] > x["Price"])
+
+    return mask_short_wick & mask_long_wick & mask_maximum & mask_red
+
+def bear_engulf(x: dict) -> np.ndarray:
+    # Second candle has a red body
+    mask_second_red = (x["Price"] < x["Open"])
+    # First candle has a green body
+    mask_first_green = (lag(x["Price"], 1) > lag(x["Open"], 1))
+    # First and second candles have short and long bodies (less than or greater than the 50th percentile)
+    mask_first_short = (lag(x["Body"], 1) <= x["50 Body"])
+    mask_second_long = (x["Body"] >= x["50 Body"])
+    # First candle is engulfed by the second candle
+    mask_engulf = (x["Low"] < lag(x["Low"], 1)) & (x["High"] > lag(x["High"], 1))
+
+    return mask_first_green & mask_second_red & mask_first_short & mask_second_long & mask_engulf
+
+def evening(x: dict) -> np.ndarray:
+    # Third candle has a red body
+    mask_third_red = (x["Open"] > x["Price"])
+    # First candle has a green body
+    mask_first_green = (lag(x["Price"], 2) > lag(x["Open"], 2))
+    # First and third candles have long bodies (body greater than the 50th percentile)
+    mask_first_long = (lag(x["Body"], 2) >= x["50 Body"])
+    mask_third_long = (x["Body"] >= x["50 Body"])
+    # Second candle has a short body (less than the 25th percentile)
+    mask_second_short = (lag(x["Body"], 1) <= x["25 Body"])
+
+    return mask_first_green & mask_third_red & mask_first_long & mask_third_long & mask_second_short
+
+def crows(x: dict) -> np.ndarray:
+    o, c, b, lw, uw = x["Open"], x["Price"], x["Body"], x["L-Wick"], x["U-Wick"]
+    # All three candles have a red body
+    mask_first_red = (lag(o, 2) > lag(c, 2))
+    mask_second_red = (lag(o, 1) > lag(c, 1))
+    mask_third_red = (o > c)
+    # All three with very small wicks
+    mask_first_wicks = (0.2*lag(b, 2) >= lag(lw, 2)) & (0.2*lag(b, 2) >= lag(uw, 2))
+    mask_second_wicks = (0.2*lag(b, 1) >= lag(lw, 1)) & (0.2*lag(b, 1) >= lag(uw, 1))
+    mask_third_wicks = (0.2*b >= lw) & (0.2*b >= uw)
+
+    return mask_first_red & mask_second_red & mask_third_red & mask_first_wicks & mask_second_wicks & mask_third_wicks
+
+def cloud(x: dict) -> np.ndarray:
+    # First candle has a green body
+    mask_first_green = (lag(x["Price"], 1) > lag(x["Open"], 1))
+    # Second candle has a red body
+    mask_second_red = (x["Open"] > x["Price"])
+    # Red candle opens above the previous green body
+    mask_red_open = (x["Open"] > lag(x["Price"], 1))
+    # Red candle closes below the midpoint of the green body
+    mask_red_close = (x["Price"] < lag(x["Open"], 1) + lag(x["Body"], 1)/2)
+
+    return mask_first_green & mask_second_red & mask_red_open & mask_red_close
+
+def doji(x: dict) -> np.ndarray:
+    # Very small bodies
+    mask_first_body = (lag(x["Body"], 1) < lag(x["5 Body"], 1))
+    mask_second_body = (x["Body"] < x["5 Body"])
+
+    return mask_first_body & mask_second_body
+
+def spinning(x: dict) -> np.ndarray:
+    b, lw, uw = x["Body"], x["L-Wick"], x["U-Wick"]
+    # Short bodies
+    mask_first_body = (lag(b, 1) < lag(x["25 Body"], 1))
+    mask_second_body = (b < x["25 Body"])
+    # Wicks with approximately equal length (less than 20% difference)
+    mask_first_wick = (abs(lag(uw, 1) - lag(lw, 1)) < 0.2*lag(uw, 1))
+    mask_second_wick = (abs(uw - lw) < 0.2*uw)
+
+    return mask_first_body & mask_second_body & mask_first_wick & mask_second_wick
+
+def falling(x: dict) -> np.ndarray:
+    o, h, l, c = x["Open"], x["High"], x["Low"], x["Price"]
+    # First and last bodies are red
+    mask_red = (lag(o, 4) > lag(c, 4)) & (o > c)
+    # Three bodies in the middle are all green
+    mask_green = (lag(c, 3) > lag(o, 3)) & (lag(c, 2) > lag(o, 2)) & (lag(c, 1) > lag(o, 1))
+    # Green candles contained within the range of the red bodies
+    mask_contain_first = (np.minimum(l, lag(l, 4)) < lag(l, 3))
+    mask_contain_third = (np.maximum(h, lag(h, 4)) > lag(h, 1))
+    # There is a falling trend
+    mask_falling = (lag(c, 4) > c)
+
+    return mask_red & mask_green & mask_contain_first & mask_contain_third & mask_falling
+
+def rising(x: dict) -> np.ndarray:
+    o, h, l, c = x["Open"], x["High"], x["Low"], x["Price"]
+    # First and last bodies are green
+    mask_green = (lag(c, 4) > lag(o, 4)) & (c > o)
+    # Three bodies in the middle are all red
+    mask_red = (lag(o, 3) > lag(c, 3)) & (lag(o, 2) > lag(c, 2)) & (lag(o, 1) > lag(c, 1))
+    # Red candles contained within the range of the green bodies
+    mask_contain_first = (np.minimum(l, lag(l, 4)) < lag(l, 3))
+    mask_contain_third = (np.maximum(h, lag(h, 4)) > lag(h, 1))
+    # There is a rising trend
+    mask_rising = (c > lag(c, 4))
+
+    return mask_red & mask_green & mask_contain_first & mask_contain_third & mask_rising
+
+# Condition of every pattern, in the order of analysis.patterns
+predicates = {"hammer": hammer, "inv_hammer": inv_hammer,
+              "bull_engulf": bull_engulf, "piercing": piercing,
+              "morning": morning, "soldiers": soldiers,
+              "hanging": hanging, "shooting": shooting,
+              "bear_engulf": bear_engulf, "evening": evening,
+              "crows": crows, "cloud": cloud,
+              "doji": doji, "spinning": spinning,
+              "falling": falling, "rising": rising}
+
+def pattern_masks(covariates: dict) -> dict:
+    """
+    Evaluate every candlestick pattern along the last axis of arrays of covariates,
+    keyed by the same column names that Identify uses
+    """
+
+    with np.errstate(invalid="ignore"):
+        return {name: predicate(covariates) for name, predicate in predicates.items()}
@@ -0,0 +1,128 @@
+"""
+Cross-sectional scanning of candlestick patterns over many instruments at once
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+from typing import Optional
+from analysis import patterns
+from data import read_clean_data, expanding_quantile_matrix, filter_data
+from predicates import pattern_masks
+
+def pattern_matrix(masks: dict) -> np.ndarray:
+    """
+    Combine pattern masks into one array of codes (positions in the patterns list, -1 for none),
+    with later patterns overwriting earlier ones as in Identify.analyse_pattern
+    """
+
+    codes = np.full(masks[patterns[0]].shape, -1, dtype=np.int8)
+    for code, name in enumerate(patterns):
+        codes[masks[name]] = code
+
+    return codes
+
+class Panel:
+    """
+    OOP cross-sectional scanning class
+    Every instrument is scanned over its own trading days, so that its patterns are exactly those of Identify
+    on that instrument alone, even when the instruments trade on different calendars
+    """
+
+    def __init__(self,
+                 data: dict,
+                 start_date: Optional[str] = "2000-01-01",
+                 end_date: Optional[str] = "2025-01-01") -> None:
+
+        frames = {name: filter_data(df, start_date, end_date) for name, df in data.items()}
+        self.names = list(frames)
+        self.dates = np.unique(np.concatenate([df["Date"].to_numpy() for df in frames.values()]))
+        self.start_date = start_date
+        self.end_date = end_date
+
+        # Covariates hold the trading days of each instrument from the left, padded with NaN,
+        # and 'positions' maps them to the union of all trading days (-1 for padding)
+        days = max(len(df) for df in frames.values())
+        self.positions = np.full((len(self.names), days), -1)
+        for i, df in enumerate(frames.values()):
+            self.positions[i, :len(df)] = np.searchsorted(self.dates, df["Date"].to_numpy())
+
+        self.covariates = {}
+        for col in ["Price", "Open", "High", "Low"]:
+            self.covariates[col] = np.full((len(self.names), days), np.nan)
+            for i, df in enumerate(frames.values()):
+                self.covariates[col][i, :len(df)] = df[col].to_numpy()
+
+        self.look_back, self.look_forward = 3, 1
+        self.quantiles = [0.05, 0.25, 0.50]
+        self.codes = None
+        print("Selected", len(self.names), "instruments over", len(self.dates), "days")
+
+    def generate_covariates(self) -> dict:
+        """
+        Calculate body, wicks, body quantiles and local extrema for every instrument at once
+        """
+
+        o, h, l, c = (self.covariates[col] for col in ["Open", "High", "Low", "Price"])
+        self.covariates["Body"] = abs(o - c)
+        self.covariates["L-Wick"] = np.minimum(o, c) - l
+        self.covariates["U-Wick"] = h - np.maximum(o, c)
+
+        # Time-consistent quantiles of every instrument at once
+        result = expanding_quantile_matrix(self.covariates["Body"], self.quantiles)
+        for q, values in zip(self.quantiles, result):
+            self.covariates[f"{int(q*100)}" + " " + "Body"] = values
+
+        # Local extrema over the asymmetrical window, truncated at the ends like asym_rolling_minmax,
+        # as the padding after an instrument's last day never wins
+        width = self.look_back + self.look_forward + 1
+        for col, fill, reduce in [("Min", np.inf, np.min), ("Max", -np.inf, np.max)]:
+            padded = np.pad(np.where(np.isnan(c), fill, c), ((0, 0), (self.look_back, self.look_forward)), constant_values=fill)
+            windows = np.lib.stride_tricks.sliding_window_view(padded, width, axis=1)
+            self.covariates[col] = (c == reduce(windows, axis=2))
+
+        return self.covariates
+
+    def on_dates(self, values: np.ndarray, fill: object) -> np.ndarray:
+        """
+        Spread an (instruments, trading days) array onto the union of all trading days
+        """
+
+        result = np.full((len(self.names), len(self.dates)), fill, dtype=values.dtype)
+        rows, cols = np.nonzero(self.positions >= 0)
+        result[rows, self.positions[rows, cols]] = values[rows, cols]
+
+        return result
+
+    def analyse_pattern(self) -> np.ndarray:
+        """
+        Scan every instrument for every pattern,
+        returning an (instruments, days) matrix of pattern codes over the union of all trading days
+        """
+
+        self.generate_covariates()
+        masks = pattern_masks(self.covariates)
+        self.codes = self.on_dates(pattern_matrix(masks), -1)
+        self.masks = {name: self.on_dates(mask, False) for name, mask in masks.items()}
+        print(int((self.codes >= 0).sum()), "patterns identified")
+
+        return self.codes
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Pattern names as a (days, instruments) dataframe
+        """
+
+        names = np.array(patterns + [""])
+
+        return pd.DataFrame(names[self.codes].T, index=pd.DatetimeIndex(self.dates, name="Date"), columns=self.names)
+
+def load_panel(countries: list,
+               start_date: Optional[str] = "2000-01-01",
+               end_date: Optional[str] = "2025-01-01") -> Panel:
+    """
+    Read the bond yield data of several countries into one panel
+    """
+
+    return Panel({country: read_clean_data(country) for country in countries}, start_date, end_date)
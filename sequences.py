@@ -0,0 +1,91 @@
+"""
+Mine sequences of candlestick patterns from the multi-label pattern bitmask
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+from typing import Optional
+from analysis import patterns
+from data import stack_copies
+from events import pattern_delays, pattern_bits
+
+def recent(indicator: np.ndarray, gap: int) -> np.ndarray:
+    """
+    Whether an indicator was true on any of the previous 'gap' days,
+    as a bitwise OR of shifted copies along the time axis that never crosses from one copy to the next
+    """
+
+    result = np.zeros_like(indicator)
+    for lag in range(1, gap + 1):
+        result[:, lag:] |= indicator[:, :-lag]
+
+    return result
+
+def cooccurrence(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Number of bars on which each pair of patterns was found together,
+    with the count of each pattern on the diagonal
+    """
+
+    bits = pattern_bits(data).reshape(-1, len(patterns)).astype(float)
+
+    return pd.DataFrame(bits.T @ bits, index=patterns, columns=patterns).astype(int)
+
+def mine_sequences(data: pd.DataFrame,
+                   max_length: Optional[int] = 3,
+                   gap: Optional[int] = 3,
+                   min_support: Optional[int] = 10,
+                   horizon: Optional[int] = 5,
+                   printout: Optional[bool] = False,
+                   look_forward: Optional[int] = 1) -> pd.DataFrame:
+    """
+    Count sequences of patterns across all Monte Carlo copies, where each pattern follows the previous one
+    within 'gap' days, e.g. a doji followed by a morning star within 3 days
+    Sequences are grown one pattern at a time from the frequent ones only (apriori), counting every extension
+    of every frequent sequence at once with a matrix product of indicators
+    A sequence is counted once per bar that completes it, and reported with the forward change in yield over
+    'horizon' days from the close of the bar on which it becomes known, i.e. the completing bar delayed by the
+    largest delay of its patterns (see events.pattern_delays)
+    """
+
+    bits = pattern_bits(data)
+    copies, days, n_patterns = bits.shape
+    price = stack_copies(data, "Price").astype(float)
+    delays = pattern_delays(look_forward)
+    forward = np.full((delays.max() + 1,) + price.shape, np.nan)
+    for d in range(delays.max() + 1):
+        forward[d, :, :-(d + horizon)] = price[:, d + horizon:] - price[:, :-(d + horizon)]
+
+    # Indicators of the bars completing each frequent sequence, as (copies, days, sequences)
+    support = bits.reshape(-1, n_patterns).sum(axis=0)
+    frequent = [(code,) for code in np.flatnonzero(support >= min_support)]
+    ends = bits[:, :, [sequence[0] for sequence in frequent]]
+    found = list(zip(frequent, np.moveaxis(ends, 2, 0)))
+
+    for length in range(2, max_length + 1):
+        if not frequent:
+            break
+        before = recent(ends, gap).reshape(-1, len(frequent)).astype(float)
+        counts = before.T @ bits.reshape(-1, n_patterns).astype(float)
+        rows, cols = np.nonzero(counts >= min_support)
+        frequent = [frequent[i] + (j,) for i, j in zip(rows, cols)]
+        ends = recent(ends, gap)[:, :, rows] & bits[:, :, cols]
+        found.extend(zip(frequent, np.moveaxis(ends, 2, 0)))
+
+    result = []
+    for sequence, indicator in found:
+        returns = forward[delays[list(sequence)].max()][indicator]
+        returns = returns[~np.isnan(returns)]
+        result.append((" > ".join(patterns[code] for code in sequence), len(sequence), int(indicator.sum()),
+                       indicator.sum() / copies,
+                       returns.mean() if len(returns) else np.nan,
+                       (returns > 0).mean() if len(returns) else np.nan))
+    result = pd.DataFrame(result, columns=["Sequence", "Length", "Events", "Per Copy", "Return", "Up Rate"]).set_index("Sequence")
+
+    if printout:
+        print("Pattern sequences within {} days found at least {} times over {} copies:".format(gap, min_support, copies))
+        print(result)
+
+    return result
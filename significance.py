@@ -0,0 +1,146 @@
+"""
+Significance of pattern and trader performance against the Monte Carlo copies and label permutations
+"""
+
+# Import libraries
+import warnings
+import numpy as np
+import pandas as pd
+
+from typing import Optional, Tuple
+from analysis import patterns
+from data import stack_copies, SEED
+from events import pattern_bits, pattern_delays, event_returns
+
+def empirical_pvalues(real: np.ndarray, synthetic: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Empirical p-values of real statistics against a (copies, ...) array of synthetic ones,
+    as the upper tail, lower tail and two-sided p-values, ignoring NaN copies
+    The real statistic counts as one draw of the null, so that no p-value is ever zero
+    """
+
+    real, synthetic = np.asarray(real, dtype=float), np.asarray(synthetic, dtype=float)
+    valid = ~np.isnan(synthetic)
+    n = valid.sum(axis=0)
+
+    with np.errstate(invalid="ignore"):
+        upper = (1 + (valid & (synthetic >= real)).sum(axis=0)) / (1 + n)
+        lower = (1 + (valid & (synthetic <= real)).sum(axis=0)) / (1 + n)
+    two_sided = np.minimum(1.0, 2 * np.minimum(upper, lower))
+    missing = np.isnan(real) | (n == 0)
+
+    return np.where(missing, np.nan, upper), np.where(missing, np.nan, lower), np.where(missing, np.nan, two_sided)
+
+def trader_significance(results: pd.DataFrame, printout: Optional[bool] = False) -> pd.DataFrame:
+    """
+    P-values of every trader's metrics on the real data (DF == 0)
+    against the synthetic copies, from the results table of Execute.evaluate
+    """
+
+    if 0 not in results.index:
+        raise Exception("Error: Results do not contain the real data (DF == 0)")
+
+    real, synthetic = results.loc[0], results[results.index != 0]
+    upper, lower, two_sided = empirical_pvalues(real.to_numpy(), synthetic.to_numpy())
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        result = pd.DataFrame({"Real": real.to_numpy(dtype=float),
+                               "MC Mean": np.nanmean(synthetic.to_numpy(dtype=float), axis=0),
+                               "P Upper": upper,
+                               "P Lower": lower,
+                               "P Value": two_sided}, index=results.columns)
+
+    if printout:
+        print("Trader significance against {} copies:".format(len(synthetic)))
+        print(result)
+
+    return result
+
+def pattern_significance(data: pd.DataFrame,
+                         horizons: Optional[int] = 10,
+                         printout: Optional[bool] = False) -> pd.DataFrame:
+    """
+    P-values of every pattern's forward change in yield and hit rate on the real data (DF == 0)
+    against the same statistics on the synthetic copies
+    """
+
+    count, mean, move, rate, ids = event_returns(data, horizons)
+    real, synthetic = (ids == 0), (ids != 0)
+    if not real.any() or not synthetic.any():
+        raise Exception("Error: Data must contain both the real data (DF == 0) and synthetic copies")
+
+    _, _, p_return = empirical_pvalues(mean[real][0], mean[synthetic])
+    _, _, p_hit = empirical_pvalues(rate[real][0], rate[synthetic])
+
+    index = pd.MultiIndex.from_product([patterns, range(1, horizons + 1)], names=["Pattern", "Horizon"])
+    result = pd.DataFrame({"Events": count[real][0].ravel(),
+                           "Return": mean[real][0].ravel(),
+                           "P Return": p_return.ravel(),
+                           "Hit Rate": rate[real][0].ravel(),
+                           "P Hit Rate": p_hit.ravel()}, index=index)
+
+    if printout:
+        print("Pattern significance against {} copies:".format(int(synthetic.sum())))
+        print(result[result["Events"] > 0])
+
+    return result
+
+def permutation_test(data: pd.DataFrame,
+                     horizon: Optional[int] = 1,
+                     permutations: Optional[int] = 5000,
+                     chunk_size: Optional[int] = 500,
+                     seed: Optional[int] = SEED,
+                     printout: Optional[bool] = False,
+                     look_forward: Optional[int] = 1) -> pd.DataFrame:
+    """
+    Permutation test of the mean forward change in yield after every pattern on the real data (DF == 0)
+    The patterns found on each day are reshuffled over the days through matrices of permuted indices, a chunk of permutations at a time,
+    so that the null distribution of every pattern comes from the same permutations without rescanning the data
+    As in event_returns, every pattern of the bitmask is an event, its forward change starts at the close of the bar
+    on which the pattern becomes known, and a permuted pattern keeps its delay
+    """
+
+    if "DF" in data.columns:
+        data = data[data["DF"] == 0]
+    price = stack_copies(data, "Price").astype(float)[0]
+    bits = pattern_bits(data)[0]
+
+    # Forward change of every day for the delay of every pattern, leaving out the last days that have no forward price
+    delays = pattern_delays(look_forward)
+    days = len(price) - horizon - delays.max()
+    forward = np.stack([price[d + horizon : d + horizon + days] - price[d : d + days] for d in delays])
+    bits = bits[:days].astype(float)
+
+    events = bits.sum(axis=0).astype(int)
+    totals = np.einsum("dp,pd->p", bits, forward)
+
+    # Each row of the index matrix is one permutation of the days,
+    # and per-pattern sums over all rows of a chunk come from a single product
+    rng = np.random.default_rng(seed)
+    null = np.empty((permutations, len(patterns)))
+    for start in range(0, permutations, chunk_size):
+        rows = min(chunk_size, permutations - start)
+        index = np.argsort(rng.random((rows, days)), axis=1)
+        null[start : start + rows] = np.einsum("rdp,pd->rp", bits[index], forward)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = totals / events
+        null /= events
+    upper, lower, two_sided = empirical_pvalues(observed, null)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        result = pd.DataFrame({"Events": events,
+                               "Return": observed,
+                               "Null Mean": np.nanmean(null, axis=0),
+                               "Null Std": np.nanstd(null, axis=0),
+                               "P Upper": upper,
+                               "P Lower": lower,
+                               "P Value": two_sided}, index=pd.Index(patterns, name="Pattern"))
+
+    if printout:
+        print("Permutation test over {} permutations at a {} day horizon:".format(permutations, horizon))
+        print(result[result["Events"] > 0])
+
+    return result
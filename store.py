@@ -0,0 +1,158 @@
+"""
+Store pattern events, trades and returns so that runs can be queried and compared later
+"""
+
+# Import libraries
+import json
+import uuid
+import sqlite3
+import pandas as pd
+
+from datetime import datetime
+from typing import Optional
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, country TEXT, created TEXT, parameters TEXT);
+CREATE TABLE IF NOT EXISTS patterns (run_id TEXT, country TEXT, df INTEGER, date TEXT, pattern TEXT, trend TEXT, price REAL);
+CREATE TABLE IF NOT EXISTS trades (run_id TEXT, country TEXT, df INTEGER, date TEXT, trader TEXT, action TEXT, price REAL);
+CREATE TABLE IF NOT EXISTS returns (run_id TEXT, country TEXT, df INTEGER, trader TEXT, metric TEXT, value REAL);
+CREATE INDEX IF NOT EXISTS patterns_lookup ON patterns (country, pattern, date);
+CREATE INDEX IF NOT EXISTS patterns_run ON patterns (run_id, pattern);
+CREATE INDEX IF NOT EXISTS trades_lookup ON trades (country, date);
+CREATE INDEX IF NOT EXISTS trades_run ON trades (run_id);
+CREATE INDEX IF NOT EXISTS returns_run ON returns (run_id, trader, metric);
+"""
+
+# Columns added after the first version of a table, added to older databases when they are opened
+migrations = {"trades": {"trader": "TEXT"}}
+
+class ResultsStore:
+    """
+    Append-only SQLite store of results, indexed by country, pattern, date and run
+    """
+
+    def __init__(self,
+                 filename: Optional[str] = "results.db",
+                 run_id: Optional[str] = None) -> None:
+
+        self.filename = filename
+        self.run_id = run_id if run_id is not None else datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.connect()
+
+    def connect(self) -> None:
+        """
+        Open the database and create the tables if needed
+        """
+
+        self.connection = sqlite3.connect(self.filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(schema)
+        with self.connection:
+            for table, columns in migrations.items():
+                existing = [row[1] for row in self.connection.execute("PRAGMA table_info({})".format(table))]
+                for column, kind in columns.items():
+                    if column not in existing:
+                        self.connection.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, kind))
+
+    def __getstate__(self) -> dict:
+        # Connections cannot be pickled, so reconnect when unpickled
+        state = self.__dict__.copy()
+        del state["connection"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.connect()
+
+    def start_run(self, country: str, parameters: Optional[dict] = None) -> str:
+        """
+        Register the current run and its parameters
+        """
+
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?)",
+                                    (self.run_id, country, datetime.now().isoformat(), json.dumps(parameters or {}, default=str)))
+
+        return self.run_id
+
+    def write(self, table: str, rows: pd.DataFrame) -> None:
+        """
+        Append rows to a table in one batched transaction, matching columns by name
+        """
+
+        placeholders = ", ".join(["?"] * len(rows.columns))
+        with self.connection:
+            self.connection.executemany("INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(rows.columns), placeholders),
+                                        rows.itertuples(index=False, name=None))
+
+    def write_patterns(self, country: str, data: pd.DataFrame) -> None:
+        """
+        Append every identified pattern in a dataframe from Identify
+        """
+
+        self.start_run(country)
+        events = data[data["Pattern"] != ""]
+        self.write("patterns", pd.DataFrame({"run_id": self.run_id,
+                                             "country": country,
+                                             "df": events["DF"].to_numpy() if "DF" in events.columns else 0,
+                                             "date": events["Date"].dt.strftime("%Y-%m-%d").to_numpy(),
+                                             "pattern": events["Pattern"].to_numpy(),
+                                             "trend": events["Trend"].to_numpy(),
+                                             "price": events["Price"].to_numpy(dtype=float)}))
+
+    def write_trades(self, country: str, trades: pd.DataFrame) -> None:
+        """
+        Append the fills of every trader from Execute: market orders at the open,
+        and stop-loss and take-profit orders at their fill price
+        """
+
+        self.start_run(country)
+        self.write("trades", pd.DataFrame({"run_id": self.run_id,
+                                           "country": country,
+                                           "df": trades["DF"].to_numpy(),
+                                           "date": pd.to_datetime(trades["Date"]).dt.strftime("%Y-%m-%d").to_numpy(),
+                                           "trader": trades["Trader"].to_numpy(),
+                                           "action": trades["Action"].to_numpy(),
+                                           "price": trades["Price"].to_numpy(dtype=float)}))
+
+    def write_returns(self, country: str, results: pd.DataFrame) -> None:
+        """
+        Append the per-copy results table from Execute.evaluate
+        """
+
+        self.start_run(country)
+        rows = results.stack(level=[0, 1]).reset_index()
+        rows.columns = ["df", "trader", "metric", "value"]
+        rows.insert(0, "country", country)
+        rows.insert(0, "run_id", self.run_id)
+        self.write("returns", rows)
+
+    def query(self,
+              table: str,
+              country: Optional[str] = None,
+              pattern: Optional[str] = None,
+              start_date: Optional[str] = None,
+              end_date: Optional[str] = None,
+              run_id: Optional[str] = None) -> pd.DataFrame:
+        """
+        Select rows of a table, filtering on any of country, pattern, date range ('YYYY-MM-DD') and run
+        """
+
+        conditions, values = [], []
+        for column, operator, value in [("country", "=", country), ("pattern", "=", pattern),
+                                        ("date", ">=", start_date), ("date", "<=", end_date),
+                                        ("run_id", "=", run_id)]:
+            if value is not None:
+                conditions.append("{} {} ?".format(column, operator))
+                values.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        return pd.read_sql_query("SELECT * FROM {}{}".format(table, where), self.connection, params=values)
+
+    def runs(self) -> pd.DataFrame:
+        """
+        List all stored runs
+        """
+
+        return pd.read_sql_query("SELECT * FROM runs ORDER BY created", self.connection)
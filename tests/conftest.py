@@ -0,0 +1,18 @@
+"""
+Let the tests import the modules at the top of the repository and read its data files
+"""
+
+# Import libraries
+import os
+import sys
+import pytest
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository)
+
+@pytest.fixture(scope="session", autouse=True)
+def repository_directory() -> None:
+    # Data files are read relative to the working directory
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(repository)
+        yield
@@ -0,0 +1,26 @@
+"""
+Reduced precision must leave the pattern hits and trader returns close to the float64 run
+"""
+
+# Import libraries
+import pytest
+import pandas as pd
+
+from montecarlo import precision_report
+
+@pytest.fixture(scope="module")
+def report() -> pd.Series:
+    return precision_report("US", copies=5, start_date="2020-01-01", printout=False)
+
+def test_flipped_hits(report):
+    # Only hits sitting on a threshold edge may flip
+    assert report["Pattern hits"] > 0
+    assert report["Flipped fraction"] <= 0.01
+
+def test_return_difference(report):
+    # A flipped hit can move a whole trade, but not more than half a point of yield over the period
+    assert report["Max return difference"] <= 0.5
+    assert report["Mean return difference"] <= 0.05
+
+def test_memory(report):
+    assert report["Float memory ratio"] <= 0.6
@@ -0,0 +1,51 @@
+"""
+Pattern predicates must handle series shorter than the bars they look back at,
+and never look back across the boundary of a Monte Carlo copy
+"""
+
+# Import libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import Identify, patterns
+from predicates import lag, pattern_masks, columns
+
+def candles(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(n)
+    price = 4 + rng.standard_normal(n).cumsum() / 10
+    open_price = price + rng.standard_normal(n) / 20
+
+    return pd.DataFrame({"Date": pd.bdate_range("2024-01-01", periods=n),
+                         "Price": price,
+                         "Open": open_price,
+                         "High": np.maximum(price, open_price) + 0.05,
+                         "Low": np.minimum(price, open_price) - 0.05,
+                         "Change %": 0.0})
+
+@pytest.mark.parametrize("n", [1, 3])
+def test_lag_short_series(n):
+    values = np.arange(n, dtype=float)
+    for days in range(1, 5):
+        lagged = lag(values, days)
+        assert lagged.shape == (n,)
+        assert np.isnan(lagged[:days]).all()
+
+@pytest.mark.parametrize("n", [1, 3])
+def test_short_frame(n):
+    identify = Identify("US", "all", start_date="2024-01-01", end_date="2024-12-31", import_df=candles(n), cache=None)
+    data = identify.analyse_pattern()
+    assert len(data) == n
+    masks = pattern_masks({col: data[col].to_numpy() for col in columns})
+    assert all(masks[name].shape == (n,) for name in patterns)
+
+
+@pytest.mark.parametrize("lengths", [[60] * 20, [60, 45, 30] * 5])
+def test_copy_boundaries(lengths):
+    # Each copy is drawn from its own seed, so the candles do not line up across the boundaries
+    stacked = pd.concat([candles(100 + k).iloc[:n].assign(DF=k) for k, n in enumerate(lengths)], ignore_index=True)
+    data = Identify("US", "all", start_date="2024-01-01", end_date="2024-12-31", import_df=stacked, cache=None).analyse_pattern()
+    for k in range(len(lengths)):
+        alone = Identify("US", "all", start_date="2024-01-01", end_date="2024-12-31",
+                         import_df=stacked[stacked["DF"] == k].drop(columns="DF").reset_index(drop=True), cache=None).analyse_pattern()
+        assert (data.loc[data["DF"] == k, "Pattern"].to_numpy() == alone["Pattern"].to_numpy()).all()
@@ -6,7 +6,153 @@ Trading government bonds
 import numpy as np
 import pandas as pd
 
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
+from data import stack_copies
+from store import ResultsStore
+
+# Trading strategies that can be simulated on whole arrays of Monte Carlo copies
+traders = ["hold", "naive", "stops"]
+
+def positions_from_signal(signal: np.ndarray,
+                          lag: Optional[int] = 1,
+                          short: Optional[bool] = False) -> np.ndarray:
+    """
+    Turn a (copies, days) signal array into the positions held each day,
+    where +1 opens a long position, -1 closes it (or goes short) and 0 keeps the current position
+    """
+
+    exit_position = -1.0 if short else 0.0
+    state = np.where(signal > 0, 1.0, np.where(signal < 0, exit_position, np.nan))
+    # We can only act on a signal 'lag' days after it appears
+    state = np.concatenate([np.full((state.shape[0], lag), np.nan), state[:, :state.shape[1] - lag]], axis=1)
+
+    # Forward fill the latest signal along the time axis
+    days = np.arange(state.shape[1])
+    last = np.maximum.accumulate(np.where(np.isnan(state), 0, days), axis=1)
+    positions = np.take_along_axis(state, last, axis=1)
+
+    return np.nan_to_num(positions, nan=0.0)
+
+def simulate_positions(positions: np.ndarray,
+                       open_price: np.ndarray,
+                       close_price: np.ndarray,
+                       cost: Optional[float] = 0.0,
+                       size: Optional[Union[float, np.ndarray]] = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Daily profit and loss and turnover of (copies, days) position arrays,
+    trading at the open and marking to market at the close
+    A size is either one for all copies or one per copy, as in simulate_orders
+    """
+
+    size = np.broadcast_to(np.asarray(size, dtype=open_price.dtype), (positions.shape[0],))
+    positions = (positions * size[:, None]).astype(open_price.dtype)
+    pnl = np.zeros(positions.shape, dtype=open_price.dtype)
+    # Overnight gap on yesterday's position, then the intraday move on today's position
+    pnl[:, 1:] = positions[:, :-1] * (open_price[:, 1:] - close_price[:, :-1]) + positions[:, 1:] * (close_price[:, 1:] - open_price[:, 1:])
+    turnover = abs(np.diff(positions, axis=1, prepend=0.0))
+    pnl -= cost * turnover
+
+    return pnl, turnover
+
+def simulate_orders(signal: np.ndarray,
+                    open_price: np.ndarray,
+                    high: np.ndarray,
+                    low: np.ndarray,
+                    close_price: np.ndarray,
+                    stop_loss: Optional[float] = None,
+                    take_profit: Optional[float] = None,
+                    cost: Optional[float] = 0.0,
+                    size: Optional[Union[float, np.ndarray]] = 1.0,
+                    fills: Optional[bool] = False) -> tuple:
+    """
+    Event-driven daily profit and loss and turnover of a (copies, days) signal array,
+    stepping through the days with every copy handled at once
+    Each copy has a compact order book: a market order from yesterday's signal, filled at the open,
+    and the stop-loss and take-profit levels of an open position, filled against the day's High and Low
+    A position that gaps through a level fills at the open, and when both levels lie within a day's range
+    the stop is assumed to have been hit first
+    With 'fills', also returns every fill as (copy, day, action, price) arrays,
+    where the action is one of "buy", "sell", "stop" and "target"
+    """
+
+    dtype = open_price.dtype
+    copies, days = signal.shape
+    size = np.broadcast_to(np.asarray(size, dtype=dtype), (copies,))
+    pnl = np.zeros((copies, days), dtype=dtype)
+    turnover = np.zeros((copies, days), dtype=dtype)
+    position = np.zeros(copies, dtype=bool)
+    stop = np.full(copies, -np.inf, dtype=dtype)
+    target = np.full(copies, np.inf, dtype=dtype)
+    orders = []
+
+    for t in range(1, days):
+        o, h, l, c = open_price[:, t], high[:, t], low[:, t], close_price[:, t]
+        held = position.copy()
+
+        # Market orders placed on yesterday's signal fill at the open
+        enter = ~position & (signal[:, t - 1] > 0)
+        leave = position & (signal[:, t - 1] < 0)
+        position = (position | enter) & ~leave
+        if stop_loss is not None:
+            stop[enter] = o[enter] - stop_loss
+        if take_profit is not None:
+            target[enter] = o[enter] + take_profit
+
+        # Resting stop-loss and take-profit orders fill against the day's range, stops first
+        stopped = position & (l <= stop)
+        taken = position & ~stopped & (h >= target)
+        exit_price = np.where(stopped, np.minimum(o, stop), np.where(taken, np.maximum(o, target), c))
+        after_open = position.copy()
+        position &= ~(stopped | taken)
+        stop[~position], target[~position] = -np.inf, np.inf
+
+        # Overnight gap on yesterday's position, then the intraday move up to the exit or the close
+        pnl[:, t] = size * (held * (o - close_price[:, t - 1]) + after_open * (exit_price - o))
+        turnover[:, t] = size * (enter.astype(int) + leave + stopped + taken)
+        if fills:
+            for action, filled, price in [("buy", enter, o), ("sell", leave, o), ("stop", stopped, exit_price), ("target", taken, exit_price)]:
+                index = np.flatnonzero(filled)
+                orders.append((index, np.full(len(index), t), np.full(len(index), action), price[index]))
+
+    pnl -= cost * turnover
+    if not fills:
+        return pnl, turnover
+
+    orders = tuple(np.concatenate(column) for column in zip(*orders)) if orders else (np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=str), np.empty(0, dtype=dtype))
+
+    return pnl, turnover, orders
+
+def position_fills(positions: np.ndarray, open_price: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every change of a (copies, days) position array as (copy, day, action, price) arrays,
+    bought or sold at the open
+    """
+
+    change = np.diff(positions, axis=1, prepend=0.0)
+    copy, day = np.nonzero(change)
+
+    return copy, day, np.where(change[copy, day] > 0, "buy", "sell"), open_price[copy, day]
+
+def performance(pnl: np.ndarray,
+                turnover: np.ndarray,
+                periods: Optional[int] = 252,
+                level: Optional[float] = 0.95) -> pd.DataFrame:
+    """
+    Risk and return metrics for every copy from its daily profit and loss
+    """
+
+    equity = np.cumsum(pnl, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0)
+    std = pnl.std(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(std > 0, pnl.mean(axis=1) / std * np.sqrt(periods), np.nan)
+
+    return pd.DataFrame({"Return": equity[:, -1],
+                         "Turnover": turnover.sum(axis=1),
+                         "Max DD": (peak - equity).max(axis=1),
+                         "Sharpe": sharpe,
+                         "VaR": -np.quantile(pnl, 1 - level, axis=1)})
 
 class Execute:
     """
@@ -15,33 +161,109 @@ class Execute:
 
     def __init__(self,
                  country: str,
-                 data: pd.DataFrame) -> None:
+                 data: pd.DataFrame,
+                 cost: Optional[float] = 0.0,
+                 size: Optional[float] = 1.0,
+                 store: Optional[ResultsStore] = None,
+                 dtype: Optional[str] = None,
+                 stop_loss: Optional[float] = 0.10,
+                 take_profit: Optional[float] = 0.20) -> None:
 
         self.data = data
         self.country = country
+        self.cost = cost
+        self.size = size
+        # Distances in yield from the entry price for the stops trader
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.store = store
+        self.dtype = dtype if dtype is not None else float
+        # Fills of every simulated trader, for the store
+        self.trades = {}
         data["Action"] = "hold"
     
-    def evaluate(self) -> Tuple[float, float, float, float]:
+    def evaluate(self,
+                 printout: Optional[bool] = True,
+                 selected: Optional[list] = None) -> pd.DataFrame:
         """
-        Evaluate all trading strategies
+        Evaluate all trading strategies (or only the 'selected' ones) on every copy at once,
+        returning a table of metrics indexed by copy with a column group per trader
         """
 
-        print("Out of Sample:")
-        self.hold_trader(self.data[self.data["DF"] == 0], True)
-        self.naive_trader(self.data[self.data["DF"] == 0], True)
-
-        print("In Sample:")
-        returns_hold, returns_naive = [], []
-        for i in range(1, self.data["DF"].iloc[-1] + 1):
-            returns_hold.append(self.hold_trader(self.data[self.data["DF"] == i]))
-            returns_naive.append(self.naive_trader(self.data[self.data["DF"] == i]))
-        returns_hold, returns_naive = np.array(returns_hold), np.array(returns_naive)
-        mean_hold, std_hold = np.mean(returns_hold), np.std(returns_hold)
-        mean_naive, std_naive = np.mean(returns_naive), np.std(returns_naive)
-        print("Holding trader gives on average {:.4f}% net increase on bond yield with {:.4f} standard deviation".format(mean_hold, std_hold))
-        print("Naive candlestick trader gives on average {:.4f}% net increase on bond yield with {:.4f} standard deviation".format(mean_naive, std_naive))
-
-        return mean_hold, std_hold, mean_naive, std_naive
+        selected = traders if selected is None else selected
+        results = pd.concat({trader: self.simulate(trader) for trader in selected}, axis=1)
+        if self.store is not None:
+            self.store.write_trades(self.country, pd.concat([self.trades[trader] for trader in selected], ignore_index=True))
+            self.store.write_returns(self.country, results)
+
+        if printout:
+            names = {"hold": "Holding trader", "naive": "Naive candlestick trader", "stops": "Candlestick trader with stops"}
+            if 0 in results.index:
+                print("Out of Sample:")
+                for trader in selected:
+                    print("{} gives {:.4f}% net increase on bond yield".format(names[trader], results.loc[0, (trader, "Return")]))
+            in_sample = results[results.index != 0]
+            if not in_sample.empty:
+                print("In Sample:")
+                for trader in selected:
+                    returns = in_sample[(trader, "Return")]
+                    print("{} gives on average {:.4f}% net increase on bond yield with {:.4f} standard deviation".format(names[trader], np.mean(returns), np.std(returns)))
+                print("Average metrics over {} copies:".format(len(in_sample)))
+                print(in_sample.mean().unstack())
+
+        return results
+
+    def positions(self, trader: str) -> np.ndarray:
+        """
+        Positions held each day by a trader, as a (copies, days) array
+        """
+
+        if trader == "hold":
+            # Buy at the first instance and sell at the last instance
+            return np.ones(stack_copies(self.data, "Price").shape)
+        elif trader == "naive":
+            # Trade only on qualitative candlestick patterns
+            trend = stack_copies(self.data, "Trend")
+            signal = np.where(trend == "up", 1, np.where(trend == "down", -1, 0))
+            positions = positions_from_signal(signal)
+            action = np.diff(positions, axis=1, prepend=0.0).ravel()
+            self.data["Action"] = np.where(action > 0, "buy", np.where(action < 0, "sell", "hold"))
+            return positions
+        else:
+            raise Exception("Error: Trader not recognised")
+
+    def simulate(self, trader: str) -> pd.DataFrame:
+        """
+        Simulate a trader on all copies with transaction costs and position sizing
+        """
+
+        open_price = stack_copies(self.data, "Open").astype(self.dtype)
+        close_price = stack_copies(self.data, "Price").astype(self.dtype)
+        if trader == "stops":
+            # Trade on the candlestick patterns, with stop-loss and take-profit orders filled intrabar
+            trend = stack_copies(self.data, "Trend")
+            signal = np.where(trend == "up", 1, np.where(trend == "down", -1, 0))
+            high = stack_copies(self.data, "High").astype(self.dtype)
+            low = stack_copies(self.data, "Low").astype(self.dtype)
+            pnl, turnover, fills = simulate_orders(signal, open_price, high, low, close_price,
+                                                   self.stop_loss, self.take_profit, self.cost, self.size, fills=True)
+        else:
+            positions = self.positions(trader)
+            pnl, turnover = simulate_positions(positions, open_price, close_price, self.cost, self.size)
+            fills = position_fills(positions, open_price)
+        ids = np.unique(self.data["DF"]) if "DF" in self.data.columns else np.zeros(1, dtype=int)
+        results = performance(pnl, turnover)
+        results.index = ids
+        results.index.name = "DF"
+
+        copy, day, action, price = fills
+        self.trades[trader] = pd.DataFrame({"DF": ids[copy],
+                                            "Date": stack_copies(self.data, "Date")[copy, day],
+                                            "Trader": trader,
+                                            "Action": action,
+                                            "Price": price.astype(float)}).sort_values(["DF", "Date"], kind="stable", ignore_index=True)
+
+        return results
     
     def hold_trader(self, df: pd.DataFrame, printout: Optional[bool] = False) -> float:
         """